@@ -28,8 +28,13 @@
 #if !defined(_CFFI_USE_EMBEDDING) && !defined(Py_LIMITED_API)
 #  ifdef _MSC_VER
 #    if !defined(_DEBUG) && !defined(Py_DEBUG) && !defined(Py_TRACE_REFS) && !defined(Py_REF_DEBUG) && !defined(_CFFI_NO_LIMITED_API)
-#      define Py_LIMITED_API
+#      if !defined(Py_GIL_DISABLED)
+#        define Py_LIMITED_API
+#      else
+#        define Py_LIMITED_API 0x030f0000
+#      endif
 #    endif
+
 #    include <pyconfig.h>
      /* sanity-check: Py_LIMITED_API will cause crashes if any of these
         are also defined.  Normally, the Python file PC/pyconfig.h does not
@@ -49,7 +54,11 @@
 #  else
 #    include <pyconfig.h>
 #    if !defined(Py_DEBUG) && !defined(Py_TRACE_REFS) && !defined(Py_REF_DEBUG) && !defined(_CFFI_NO_LIMITED_API)
-#      define Py_LIMITED_API
+#      if !defined(Py_GIL_DISABLED)
+#        define Py_LIMITED_API
+#      else
+#        define Py_LIMITED_API 0x030f0000
+#      endif
 #    endif
 #  endif
 #endif
@@ -59,6 +68,9 @@
 extern "C" {
 #endif
 #include <stddef.h>
+#include <stdlib.h>
+#include <string.h>
+
 
 /* This part is from file 'cffi/parse_c_type.h'.  It is copied at the
    beginning of C sources generated by CFFI's ffi.set_source(). */
@@ -281,11 +293,15 @@ static int search_in_struct_unions(const struct _cffi_type_context_s *ctx,
     typedef unsigned char _Bool;
 #  endif
 # endif
+# define _cffi_float_complex_t   _Fcomplex    /* include <complex.h> for it */
+# define _cffi_double_complex_t  _Dcomplex    /* include <complex.h> for it */
 #else
 # include <stdint.h>
 # if (defined (__SVR4) && defined (__sun)) || defined(_AIX) || defined(__hpux)
 #  include <alloca.h>
 # endif
+# define _cffi_float_complex_t   float _Complex
+# define _cffi_double_complex_t  double _Complex
 #endif
 
 #ifdef __GNUC__
@@ -304,13 +320,9 @@ static int search_in_struct_unions(const struct _cffi_type_context_s *ctx,
 #ifndef PYPY_VERSION
 
 
-#if PY_MAJOR_VERSION >= 3
-# define PyInt_FromLong PyLong_FromLong
-#endif
-
 #define _cffi_from_c_double PyFloat_FromDouble
 #define _cffi_from_c_float PyFloat_FromDouble
-#define _cffi_from_c_long PyInt_FromLong
+#define _cffi_from_c_long PyLong_FromLong
 #define _cffi_from_c_ulong PyLong_FromUnsignedLong
 #define _cffi_from_c_longlong PyLong_FromLongLong
 #define _cffi_from_c_ulonglong PyLong_FromUnsignedLongLong
@@ -322,12 +334,12 @@ static int search_in_struct_unions(const struct _cffi_type_context_s *ctx,
 #define _cffi_from_c_int(x, type)                                        \
     (((type)-1) > 0 ? /* unsigned */                                     \
         (sizeof(type) < sizeof(long) ?                                   \
-            PyInt_FromLong((long)x) :                                    \
+            PyLong_FromLong((long)x) :                                   \
          sizeof(type) == sizeof(long) ?                                  \
             PyLong_FromUnsignedLong((unsigned long)x) :                  \
             PyLong_FromUnsignedLongLong((unsigned long long)x)) :        \
         (sizeof(type) <= sizeof(long) ?                                  \
-            PyInt_FromLong((long)x) :                                    \
+            PyLong_FromLong((long)x) :                                   \
             PyLong_FromLongLong((long long)x)))
 
 #define _cffi_to_c_int(o, type)                                          \
@@ -603,7 +615,7 @@ void wgs84_to_gcj02 (double y, double x, double *ret)
   t4 = t3 * t3;
   t6 = x - 0.1050e3;
   t8 = 0.1e0 * t6 * t3;
-  t9 = sqrt(t6);
+  t9 = sqrt(fabs(t6));
   t11 = t6 * 0.3141592654e1;
   t13 = sin(0.60e1 * t11);
   t14 = 0.1333333333e2 * t13;
@@ -709,7 +721,7 @@ void wgs84_to_gcj02_jac (double y, double x, double *ret)
   t35 = t3 * t3;
   t37 = x - 0.1050e3;
   t39 = 0.1e0 * t37 * t3;
-  t40 = sqrt(t37);
+  t40 = sqrt(fabs(t37));
   t42 = t37 * 0.3141592654e1;
   t43 = 0.60e1 * t42;
   t44 = sin(t43);
@@ -735,7 +747,7 @@ void wgs84_to_gcj02_jac (double y, double x, double *ret)
   t85 = 0.12500e3 + x + 0.20e1 * y + 0.1e0 * t71 + t39 + 0.1e0 * t40 + t45 + t48 + 0.1333333333e2 * t74 + 0.2666666667e2 * t77 + 0.1000000000e3 * t80 + 0.2000000000e3 * t83;
   t91 = t59 * t59;
   t97 = 0.1e0 * y;
-  t98 = 0.1e1 / t40;
+  t98 = (t37 < 0.0e0 ? -0.1e1 : 0.1e1) / t40;
   t100 = cos(t43);
   t102 = 0.7999999998e2 * t100 * 0.3141592654e1;
   t103 = cos(t46);
@@ -805,17 +817,231 @@ void bd09_to_gcj02 (double y, double x, double *ret)
   ret[0] = -t11 * t18;
   ret[1] = t11 * t20;
 }
+/* array loops over the generated kernels in cvt_geosys_mpl.c, which is
+   prepended by compile.py. mask may be NULL, out may alias the input. */
+
+void wgs84_to_gcj02_n (const double *y, const double *x, const char *mask,
+                       long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    wgs84_to_gcj02(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+/* newton iteration on f(w) = g with the analytic jacobian, returns 1 when
+   the residual drops below tol (degrees) within max_iter steps. a converged
+   point gets one more step, kept only if it does not increase the residual,
+   to settle on the last ulp. */
+int gcj02_to_wgs84_newton (double y, double x, double tol, int max_iter,
+                           double *ret)
+{
+  double f[2], j[4], w[2], ry, rx, det, r, r_ok = -1;
+  int k;
+  w[0] = y;
+  w[1] = x;
+  for (k = 0; ; k++) {
+    wgs84_to_gcj02(w[0], w[1], f);
+    ry = f[0] - y;
+    rx = f[1] - x;
+    r = fmax(fabs(ry), fabs(rx));
+    if (r_ok >= 0) {
+      if (r <= r_ok) {
+        ret[0] = w[0];
+        ret[1] = w[1];
+      }
+      return 1;
+    }
+    ret[0] = w[0];
+    ret[1] = w[1];
+    if (r <= tol)
+      r_ok = r;
+    else if (k >= max_iter)
+      return 0;
+    if (r == 0)
+      return 1;
+    /* j is column major: d(y, x)/dy, d(y, x)/dx */
+    wgs84_to_gcj02_jac(w[0], w[1], j);
+    det = j[0] * j[3] - j[2] * j[1];
+    if (isfinite(det) && det != 0) {
+      w[0] -= (j[3] * ry - j[2] * rx) / det;
+      w[1] -= (j[0] * rx - j[1] * ry) / det;
+    }
+    else {
+      /* the sqrt(|x - 105|) term has no derivative at x = 105 */
+      w[0] -= ry;
+      w[1] -= rx;
+    }
+  }
+}
+
+void gcj02_to_wgs84_n (const double *y, const double *x, const char *mask,
+                       long n, double tol, int max_iter, char *converged,
+                       double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  char ok;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      ok = 1;
+    }
+    else {
+      ok = gcj02_to_wgs84_newton(y[i], x[i], tol, max_iter, ret);
+      out_y[i] = ret[0];
+      out_x[i] = ret[1];
+    }
+    if (converged)
+      converged[i] = ok;
+  }
+}
+
+/* bd09 chains, in_china selects whether the gcj02 offset applies */
+void wgs84_to_bd09 (double y, double x, int in_china, double *ret)
+{
+  double g[2] = {y, x};
+  if (in_china)
+    wgs84_to_gcj02(y, x, g);
+  gcj02_to_bd09(g[0], g[1], ret);
+}
+
+int bd09_to_wgs84 (double y, double x, int in_china, double tol, int max_iter,
+                   double *ret)
+{
+  double g[2];
+  bd09_to_gcj02(y, x, g);
+  if (!in_china) {
+    ret[0] = g[0];
+    ret[1] = g[1];
+    return 1;
+  }
+  return gcj02_to_wgs84_newton(g[0], g[1], tol, max_iter, ret);
+}
+
+void gcj02_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    gcj02_to_bd09(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+void bd09_to_gcj02_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    bd09_to_gcj02(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+/* here mask is the china mask, the bd09 offset applies to every point */
+void wgs84_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    wgs84_to_bd09(y[i], x[i], !mask || mask[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+void bd09_to_wgs84_n (const double *y, const double *x, const char *mask,
+                      long n, double tol, int max_iter, char *converged,
+                      double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  char ok;
+  for (i = 0; i < n; i++) {
+    ok = bd09_to_wgs84(y[i], x[i], !mask || mask[i], tol, max_iter, ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+    if (converged)
+      converged[i] = ok;
+  }
+}
 
 
 /************************************************************/
 
 static void *_cffi_types[] = {
-/*  0 */ _CFFI_OP(_CFFI_OP_FUNCTION, 5), // void()(double, double, double *)
+/*  0 */ _CFFI_OP(_CFFI_OP_FUNCTION, 4), // int()(double, double, double, int, double *)
 /*  1 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14), // double
 /*  2 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
-/*  3 */ _CFFI_OP(_CFFI_OP_POINTER, 1), // double *
-/*  4 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
-/*  5 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 0), // void
+/*  3 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/*  4 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 7), // int
+/*  5 */ _CFFI_OP(_CFFI_OP_POINTER, 1), // double *
+/*  6 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/*  7 */ _CFFI_OP(_CFFI_OP_FUNCTION, 4), // int()(double, double, int, double, int, double *)
+/*  8 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/*  9 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 10 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 7),
+/* 11 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 12 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 7),
+/* 13 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 14 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/* 15 */ _CFFI_OP(_CFFI_OP_FUNCTION, 46), // void()(double const *, double const *, char const *, long, double *, double *)
+/* 16 */ _CFFI_OP(_CFFI_OP_POINTER, 1), // double const *
+/* 17 */ _CFFI_OP(_CFFI_OP_NOOP, 16),
+/* 18 */ _CFFI_OP(_CFFI_OP_POINTER, 45), // char const *
+/* 19 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 9), // long
+/* 20 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 21 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 22 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/* 23 */ _CFFI_OP(_CFFI_OP_FUNCTION, 46), // void()(double const *, double const *, char const *, long, double, int, char *, double *, double *)
+/* 24 */ _CFFI_OP(_CFFI_OP_NOOP, 16),
+/* 25 */ _CFFI_OP(_CFFI_OP_NOOP, 16),
+/* 26 */ _CFFI_OP(_CFFI_OP_NOOP, 18),
+/* 27 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 9),
+/* 28 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 29 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 7),
+/* 30 */ _CFFI_OP(_CFFI_OP_POINTER, 45), // char *
+/* 31 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 32 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 33 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/* 34 */ _CFFI_OP(_CFFI_OP_FUNCTION, 46), // void()(double, double, double *)
+/* 35 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 36 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 37 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 38 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/* 39 */ _CFFI_OP(_CFFI_OP_FUNCTION, 46), // void()(double, double, int, double *)
+/* 40 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 41 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 14),
+/* 42 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 7),
+/* 43 */ _CFFI_OP(_CFFI_OP_NOOP, 5),
+/* 44 */ _CFFI_OP(_CFFI_OP_FUNCTION_END, 0),
+/* 45 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 2), // char
+/* 46 */ _CFFI_OP(_CFFI_OP_PRIMITIVE, 0), // void
 };
 
 static void _cffi_d_bd09_to_gcj02(double x0, double x1, double * x2)
@@ -847,10 +1073,10 @@ _cffi_f_bd09_to_gcj02(PyObject *self, PyObject *args)
     return NULL;
 
   datasize = _cffi_prepare_pointer_call_argument(
-      _cffi_type(3), arg2, (char **)&x2);
+      _cffi_type(5), arg2, (char **)&x2);
   if (datasize != 0) {
     x2 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
-    if (_cffi_convert_array_argument(_cffi_type(3), arg2, (char **)&x2,
+    if (_cffi_convert_array_argument(_cffi_type(5), arg2, (char **)&x2,
             datasize, &large_args_free) < 0)
       return NULL;
   }
@@ -870,24 +1096,122 @@ _cffi_f_bd09_to_gcj02(PyObject *self, PyObject *args)
 #  define _cffi_f_bd09_to_gcj02 _cffi_d_bd09_to_gcj02
 #endif
 
-static void _cffi_d_wgs84_to_gcj02(double x0, double x1, double * x2)
+static void _cffi_d_bd09_to_gcj02_n(double const * x0, double const * x1, char const * x2, long x3, double * x4, double * x5)
 {
-  wgs84_to_gcj02(x0, x1, x2);
+  bd09_to_gcj02_n(x0, x1, x2, x3, x4, x5);
 }
 #ifndef PYPY_VERSION
 static PyObject *
-_cffi_f_wgs84_to_gcj02(PyObject *self, PyObject *args)
+_cffi_f_bd09_to_gcj02_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double * x4;
+  double * x5;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
+
+  if (!PyArg_UnpackTuple(args, "bd09_to_gcj02_n", 6, 6, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5))
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg4, (char **)&x4);
+  if (datasize != 0) {
+    x4 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg4, (char **)&x4,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg5, (char **)&x5);
+  if (datasize != 0) {
+    x5 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg5, (char **)&x5,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { bd09_to_gcj02_n(x0, x1, x2, x3, x4, x5); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_bd09_to_gcj02_n _cffi_d_bd09_to_gcj02_n
+#endif
+
+static int _cffi_d_bd09_to_wgs84(double x0, double x1, int x2, double x3, int x4, double * x5)
+{
+  return bd09_to_wgs84(x0, x1, x2, x3, x4, x5);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_bd09_to_wgs84(PyObject *self, PyObject *args)
 {
   double x0;
   double x1;
-  double * x2;
+  int x2;
+  double x3;
+  int x4;
+  double * x5;
   Py_ssize_t datasize;
   struct _cffi_freeme_s *large_args_free = NULL;
+  int result;
+  PyObject *pyresult;
   PyObject *arg0;
   PyObject *arg1;
   PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
 
-  if (!PyArg_UnpackTuple(args, "wgs84_to_gcj02", 3, 3, &arg0, &arg1, &arg2))
+  if (!PyArg_UnpackTuple(args, "bd09_to_wgs84", 6, 6, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5))
     return NULL;
 
   x0 = (double)_cffi_to_c_double(arg0);
@@ -898,18 +1222,143 @@ _cffi_f_wgs84_to_gcj02(PyObject *self, PyObject *args)
   if (x1 == (double)-1 && PyErr_Occurred())
     return NULL;
 
+  x2 = _cffi_to_c_int(arg2, int);
+  if (x2 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
+  x3 = (double)_cffi_to_c_double(arg3);
+  if (x3 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x4 = _cffi_to_c_int(arg4, int);
+  if (x4 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
   datasize = _cffi_prepare_pointer_call_argument(
-      _cffi_type(3), arg2, (char **)&x2);
+      _cffi_type(5), arg5, (char **)&x5);
   if (datasize != 0) {
-    x2 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
-    if (_cffi_convert_array_argument(_cffi_type(3), arg2, (char **)&x2,
+    x5 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg5, (char **)&x5,
             datasize, &large_args_free) < 0)
       return NULL;
   }
 
   Py_BEGIN_ALLOW_THREADS
   _cffi_restore_errno();
-  { wgs84_to_gcj02(x0, x1, x2); }
+  { result = bd09_to_wgs84(x0, x1, x2, x3, x4, x5); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  pyresult = _cffi_from_c_int(result, int);
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  return pyresult;
+}
+#else
+#  define _cffi_f_bd09_to_wgs84 _cffi_d_bd09_to_wgs84
+#endif
+
+static void _cffi_d_bd09_to_wgs84_n(double const * x0, double const * x1, char const * x2, long x3, double x4, int x5, char * x6, double * x7, double * x8)
+{
+  bd09_to_wgs84_n(x0, x1, x2, x3, x4, x5, x6, x7, x8);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_bd09_to_wgs84_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double x4;
+  int x5;
+  char * x6;
+  double * x7;
+  double * x8;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
+  PyObject *arg6;
+  PyObject *arg7;
+  PyObject *arg8;
+
+  if (!PyArg_UnpackTuple(args, "bd09_to_wgs84_n", 9, 9, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5, &arg6, &arg7, &arg8))
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
+    return NULL;
+
+  x4 = (double)_cffi_to_c_double(arg4);
+  if (x4 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x5 = _cffi_to_c_int(arg5, int);
+  if (x5 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(30), arg6, (char **)&x6);
+  if (datasize != 0) {
+    x6 = ((size_t)datasize) <= 640 ? (char *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(30), arg6, (char **)&x6,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg7, (char **)&x7);
+  if (datasize != 0) {
+    x7 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg7, (char **)&x7,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg8, (char **)&x8);
+  if (datasize != 0) {
+    x8 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg8, (char **)&x8,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { bd09_to_wgs84_n(x0, x1, x2, x3, x4, x5, x6, x7, x8); }
   _cffi_save_errno();
   Py_END_ALLOW_THREADS
 
@@ -919,16 +1368,16 @@ _cffi_f_wgs84_to_gcj02(PyObject *self, PyObject *args)
   return Py_None;
 }
 #else
-#  define _cffi_f_wgs84_to_gcj02 _cffi_d_wgs84_to_gcj02
+#  define _cffi_f_bd09_to_wgs84_n _cffi_d_bd09_to_wgs84_n
 #endif
 
-static void _cffi_d_wgs84_to_gcj02_jac(double x0, double x1, double * x2)
+static void _cffi_d_gcj02_to_bd09(double x0, double x1, double * x2)
 {
-  wgs84_to_gcj02_jac(x0, x1, x2);
+  gcj02_to_bd09(x0, x1, x2);
 }
 #ifndef PYPY_VERSION
 static PyObject *
-_cffi_f_wgs84_to_gcj02_jac(PyObject *self, PyObject *args)
+_cffi_f_gcj02_to_bd09(PyObject *self, PyObject *args)
 {
   double x0;
   double x1;
@@ -939,7 +1388,7 @@ _cffi_f_wgs84_to_gcj02_jac(PyObject *self, PyObject *args)
   PyObject *arg1;
   PyObject *arg2;
 
-  if (!PyArg_UnpackTuple(args, "wgs84_to_gcj02_jac", 3, 3, &arg0, &arg1, &arg2))
+  if (!PyArg_UnpackTuple(args, "gcj02_to_bd09", 3, 3, &arg0, &arg1, &arg2))
     return NULL;
 
   x0 = (double)_cffi_to_c_double(arg0);
@@ -951,17 +1400,17 @@ _cffi_f_wgs84_to_gcj02_jac(PyObject *self, PyObject *args)
     return NULL;
 
   datasize = _cffi_prepare_pointer_call_argument(
-      _cffi_type(3), arg2, (char **)&x2);
+      _cffi_type(5), arg2, (char **)&x2);
   if (datasize != 0) {
     x2 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
-    if (_cffi_convert_array_argument(_cffi_type(3), arg2, (char **)&x2,
+    if (_cffi_convert_array_argument(_cffi_type(5), arg2, (char **)&x2,
             datasize, &large_args_free) < 0)
       return NULL;
   }
 
   Py_BEGIN_ALLOW_THREADS
   _cffi_restore_errno();
-  { wgs84_to_gcj02_jac(x0, x1, x2); }
+  { gcj02_to_bd09(x0, x1, x2); }
   _cffi_save_errno();
   Py_END_ALLOW_THREADS
 
@@ -971,64 +1420,673 @@ _cffi_f_wgs84_to_gcj02_jac(PyObject *self, PyObject *args)
   return Py_None;
 }
 #else
-#  define _cffi_f_wgs84_to_gcj02_jac _cffi_d_wgs84_to_gcj02_jac
+#  define _cffi_f_gcj02_to_bd09 _cffi_d_gcj02_to_bd09
 #endif
 
-static const struct _cffi_global_s _cffi_globals[] = {
-  { "bd09_to_gcj02", (void *)_cffi_f_bd09_to_gcj02, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 0), (void *)_cffi_d_bd09_to_gcj02 },
-  { "wgs84_to_gcj02", (void *)_cffi_f_wgs84_to_gcj02, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 0), (void *)_cffi_d_wgs84_to_gcj02 },
-  { "wgs84_to_gcj02_jac", (void *)_cffi_f_wgs84_to_gcj02_jac, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 0), (void *)_cffi_d_wgs84_to_gcj02_jac },
-};
+static void _cffi_d_gcj02_to_bd09_n(double const * x0, double const * x1, char const * x2, long x3, double * x4, double * x5)
+{
+  gcj02_to_bd09_n(x0, x1, x2, x3, x4, x5);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_gcj02_to_bd09_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double * x4;
+  double * x5;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
 
-static const struct _cffi_type_context_s _cffi_type_context = {
-  _cffi_types,
-  _cffi_globals,
-  NULL,  /* no fields */
-  NULL,  /* no struct_unions */
-  NULL,  /* no enums */
-  NULL,  /* no typenames */
-  3,  /* num_globals */
-  0,  /* num_struct_unions */
-  0,  /* num_enums */
-  0,  /* num_typenames */
-  NULL,  /* no includes */
-  6,  /* num_types */
-  0,  /* flags */
-};
+  if (!PyArg_UnpackTuple(args, "gcj02_to_bd09_n", 6, 6, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5))
+    return NULL;
 
-#ifdef __GNUC__
-#  pragma GCC visibility push(default)  /* for -fvisibility= */
-#endif
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
 
-#ifdef PYPY_VERSION
-PyMODINIT_FUNC
-_cffi_pypyinit__cvt_geosys(const void *p[])
-{
-    p[0] = (const void *)0x2601;
-    p[1] = &_cffi_type_context;
-#if PY_MAJOR_VERSION >= 3
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
     return NULL;
-#endif
-}
-#  ifdef _MSC_VER
-     PyMODINIT_FUNC
-#  if PY_MAJOR_VERSION >= 3
-     PyInit__cvt_geosys(void) { return NULL; }
-#  else
-     init_cvt_geosys(void) { }
-#  endif
-#  endif
-#elif PY_MAJOR_VERSION >= 3
-PyMODINIT_FUNC
-PyInit__cvt_geosys(void)
-{
-  return _cffi_init("geosys._cvt_geosys", 0x2601, &_cffi_type_context);
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg4, (char **)&x4);
+  if (datasize != 0) {
+    x4 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg4, (char **)&x4,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg5, (char **)&x5);
+  if (datasize != 0) {
+    x5 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg5, (char **)&x5,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { gcj02_to_bd09_n(x0, x1, x2, x3, x4, x5); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_gcj02_to_bd09_n _cffi_d_gcj02_to_bd09_n
+#endif
+
+static void _cffi_d_gcj02_to_wgs84_n(double const * x0, double const * x1, char const * x2, long x3, double x4, int x5, char * x6, double * x7, double * x8)
+{
+  gcj02_to_wgs84_n(x0, x1, x2, x3, x4, x5, x6, x7, x8);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_gcj02_to_wgs84_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double x4;
+  int x5;
+  char * x6;
+  double * x7;
+  double * x8;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
+  PyObject *arg6;
+  PyObject *arg7;
+  PyObject *arg8;
+
+  if (!PyArg_UnpackTuple(args, "gcj02_to_wgs84_n", 9, 9, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5, &arg6, &arg7, &arg8))
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
+    return NULL;
+
+  x4 = (double)_cffi_to_c_double(arg4);
+  if (x4 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x5 = _cffi_to_c_int(arg5, int);
+  if (x5 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(30), arg6, (char **)&x6);
+  if (datasize != 0) {
+    x6 = ((size_t)datasize) <= 640 ? (char *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(30), arg6, (char **)&x6,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg7, (char **)&x7);
+  if (datasize != 0) {
+    x7 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg7, (char **)&x7,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg8, (char **)&x8);
+  if (datasize != 0) {
+    x8 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg8, (char **)&x8,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { gcj02_to_wgs84_n(x0, x1, x2, x3, x4, x5, x6, x7, x8); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_gcj02_to_wgs84_n _cffi_d_gcj02_to_wgs84_n
+#endif
+
+static int _cffi_d_gcj02_to_wgs84_newton(double x0, double x1, double x2, int x3, double * x4)
+{
+  return gcj02_to_wgs84_newton(x0, x1, x2, x3, x4);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_gcj02_to_wgs84_newton(PyObject *self, PyObject *args)
+{
+  double x0;
+  double x1;
+  double x2;
+  int x3;
+  double * x4;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  int result;
+  PyObject *pyresult;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+
+  if (!PyArg_UnpackTuple(args, "gcj02_to_wgs84_newton", 5, 5, &arg0, &arg1, &arg2, &arg3, &arg4))
+    return NULL;
+
+  x0 = (double)_cffi_to_c_double(arg0);
+  if (x0 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x1 = (double)_cffi_to_c_double(arg1);
+  if (x1 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x2 = (double)_cffi_to_c_double(arg2);
+  if (x2 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x3 = _cffi_to_c_int(arg3, int);
+  if (x3 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg4, (char **)&x4);
+  if (datasize != 0) {
+    x4 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg4, (char **)&x4,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { result = gcj02_to_wgs84_newton(x0, x1, x2, x3, x4); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  pyresult = _cffi_from_c_int(result, int);
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  return pyresult;
+}
+#else
+#  define _cffi_f_gcj02_to_wgs84_newton _cffi_d_gcj02_to_wgs84_newton
+#endif
+
+static void _cffi_d_wgs84_to_bd09(double x0, double x1, int x2, double * x3)
+{
+  wgs84_to_bd09(x0, x1, x2, x3);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_wgs84_to_bd09(PyObject *self, PyObject *args)
+{
+  double x0;
+  double x1;
+  int x2;
+  double * x3;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+
+  if (!PyArg_UnpackTuple(args, "wgs84_to_bd09", 4, 4, &arg0, &arg1, &arg2, &arg3))
+    return NULL;
+
+  x0 = (double)_cffi_to_c_double(arg0);
+  if (x0 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x1 = (double)_cffi_to_c_double(arg1);
+  if (x1 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x2 = _cffi_to_c_int(arg2, int);
+  if (x2 == (int)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg3, (char **)&x3);
+  if (datasize != 0) {
+    x3 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg3, (char **)&x3,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { wgs84_to_bd09(x0, x1, x2, x3); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
 }
 #else
+#  define _cffi_f_wgs84_to_bd09 _cffi_d_wgs84_to_bd09
+#endif
+
+static void _cffi_d_wgs84_to_bd09_n(double const * x0, double const * x1, char const * x2, long x3, double * x4, double * x5)
+{
+  wgs84_to_bd09_n(x0, x1, x2, x3, x4, x5);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_wgs84_to_bd09_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double * x4;
+  double * x5;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
+
+  if (!PyArg_UnpackTuple(args, "wgs84_to_bd09_n", 6, 6, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5))
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg4, (char **)&x4);
+  if (datasize != 0) {
+    x4 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg4, (char **)&x4,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg5, (char **)&x5);
+  if (datasize != 0) {
+    x5 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg5, (char **)&x5,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { wgs84_to_bd09_n(x0, x1, x2, x3, x4, x5); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_wgs84_to_bd09_n _cffi_d_wgs84_to_bd09_n
+#endif
+
+static void _cffi_d_wgs84_to_gcj02(double x0, double x1, double * x2)
+{
+  wgs84_to_gcj02(x0, x1, x2);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_wgs84_to_gcj02(PyObject *self, PyObject *args)
+{
+  double x0;
+  double x1;
+  double * x2;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+
+  if (!PyArg_UnpackTuple(args, "wgs84_to_gcj02", 3, 3, &arg0, &arg1, &arg2))
+    return NULL;
+
+  x0 = (double)_cffi_to_c_double(arg0);
+  if (x0 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x1 = (double)_cffi_to_c_double(arg1);
+  if (x1 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { wgs84_to_gcj02(x0, x1, x2); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_wgs84_to_gcj02 _cffi_d_wgs84_to_gcj02
+#endif
+
+static void _cffi_d_wgs84_to_gcj02_jac(double x0, double x1, double * x2)
+{
+  wgs84_to_gcj02_jac(x0, x1, x2);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_wgs84_to_gcj02_jac(PyObject *self, PyObject *args)
+{
+  double x0;
+  double x1;
+  double * x2;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+
+  if (!PyArg_UnpackTuple(args, "wgs84_to_gcj02_jac", 3, 3, &arg0, &arg1, &arg2))
+    return NULL;
+
+  x0 = (double)_cffi_to_c_double(arg0);
+  if (x0 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  x1 = (double)_cffi_to_c_double(arg1);
+  if (x1 == (double)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { wgs84_to_gcj02_jac(x0, x1, x2); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_wgs84_to_gcj02_jac _cffi_d_wgs84_to_gcj02_jac
+#endif
+
+static void _cffi_d_wgs84_to_gcj02_n(double const * x0, double const * x1, char const * x2, long x3, double * x4, double * x5)
+{
+  wgs84_to_gcj02_n(x0, x1, x2, x3, x4, x5);
+}
+#ifndef PYPY_VERSION
+static PyObject *
+_cffi_f_wgs84_to_gcj02_n(PyObject *self, PyObject *args)
+{
+  double const * x0;
+  double const * x1;
+  char const * x2;
+  long x3;
+  double * x4;
+  double * x5;
+  Py_ssize_t datasize;
+  struct _cffi_freeme_s *large_args_free = NULL;
+  PyObject *arg0;
+  PyObject *arg1;
+  PyObject *arg2;
+  PyObject *arg3;
+  PyObject *arg4;
+  PyObject *arg5;
+
+  if (!PyArg_UnpackTuple(args, "wgs84_to_gcj02_n", 6, 6, &arg0, &arg1, &arg2, &arg3, &arg4, &arg5))
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg0, (char **)&x0);
+  if (datasize != 0) {
+    x0 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg0, (char **)&x0,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(16), arg1, (char **)&x1);
+  if (datasize != 0) {
+    x1 = ((size_t)datasize) <= 640 ? (double const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(16), arg1, (char **)&x1,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(18), arg2, (char **)&x2);
+  if (datasize != 0) {
+    x2 = ((size_t)datasize) <= 640 ? (char const *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(18), arg2, (char **)&x2,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  x3 = _cffi_to_c_int(arg3, long);
+  if (x3 == (long)-1 && PyErr_Occurred())
+    return NULL;
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg4, (char **)&x4);
+  if (datasize != 0) {
+    x4 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg4, (char **)&x4,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  datasize = _cffi_prepare_pointer_call_argument(
+      _cffi_type(5), arg5, (char **)&x5);
+  if (datasize != 0) {
+    x5 = ((size_t)datasize) <= 640 ? (double *)alloca((size_t)datasize) : NULL;
+    if (_cffi_convert_array_argument(_cffi_type(5), arg5, (char **)&x5,
+            datasize, &large_args_free) < 0)
+      return NULL;
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  _cffi_restore_errno();
+  { wgs84_to_gcj02_n(x0, x1, x2, x3, x4, x5); }
+  _cffi_save_errno();
+  Py_END_ALLOW_THREADS
+
+  (void)self; /* unused */
+  if (large_args_free != NULL) _cffi_free_array_arguments(large_args_free);
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+#else
+#  define _cffi_f_wgs84_to_gcj02_n _cffi_d_wgs84_to_gcj02_n
+#endif
+
+static const struct _cffi_global_s _cffi_globals[] = {
+  { "bd09_to_gcj02", (void *)_cffi_f_bd09_to_gcj02, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 34), (void *)_cffi_d_bd09_to_gcj02 },
+  { "bd09_to_gcj02_n", (void *)_cffi_f_bd09_to_gcj02_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 15), (void *)_cffi_d_bd09_to_gcj02_n },
+  { "bd09_to_wgs84", (void *)_cffi_f_bd09_to_wgs84, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 7), (void *)_cffi_d_bd09_to_wgs84 },
+  { "bd09_to_wgs84_n", (void *)_cffi_f_bd09_to_wgs84_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 23), (void *)_cffi_d_bd09_to_wgs84_n },
+  { "gcj02_to_bd09", (void *)_cffi_f_gcj02_to_bd09, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 34), (void *)_cffi_d_gcj02_to_bd09 },
+  { "gcj02_to_bd09_n", (void *)_cffi_f_gcj02_to_bd09_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 15), (void *)_cffi_d_gcj02_to_bd09_n },
+  { "gcj02_to_wgs84_n", (void *)_cffi_f_gcj02_to_wgs84_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 23), (void *)_cffi_d_gcj02_to_wgs84_n },
+  { "gcj02_to_wgs84_newton", (void *)_cffi_f_gcj02_to_wgs84_newton, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 0), (void *)_cffi_d_gcj02_to_wgs84_newton },
+  { "wgs84_to_bd09", (void *)_cffi_f_wgs84_to_bd09, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 39), (void *)_cffi_d_wgs84_to_bd09 },
+  { "wgs84_to_bd09_n", (void *)_cffi_f_wgs84_to_bd09_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 15), (void *)_cffi_d_wgs84_to_bd09_n },
+  { "wgs84_to_gcj02", (void *)_cffi_f_wgs84_to_gcj02, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 34), (void *)_cffi_d_wgs84_to_gcj02 },
+  { "wgs84_to_gcj02_jac", (void *)_cffi_f_wgs84_to_gcj02_jac, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 34), (void *)_cffi_d_wgs84_to_gcj02_jac },
+  { "wgs84_to_gcj02_n", (void *)_cffi_f_wgs84_to_gcj02_n, _CFFI_OP(_CFFI_OP_CPYTHON_BLTN_V, 15), (void *)_cffi_d_wgs84_to_gcj02_n },
+};
+
+static const struct _cffi_type_context_s _cffi_type_context = {
+  _cffi_types,
+  _cffi_globals,
+  NULL,  /* no fields */
+  NULL,  /* no struct_unions */
+  NULL,  /* no enums */
+  NULL,  /* no typenames */
+  13,  /* num_globals */
+  0,  /* num_struct_unions */
+  0,  /* num_enums */
+  0,  /* num_typenames */
+  NULL,  /* no includes */
+  47,  /* num_types */
+  0,  /* flags */
+};
+
+#ifdef __GNUC__
+#  pragma GCC visibility push(default)  /* for -fvisibility= */
+#endif
+
+#ifdef PYPY_VERSION
+PyMODINIT_FUNC
+_cffi_pypyinit__cvt_geosys(const void *p[])
+{
+    p[0] = (const void *)0x2601;
+    p[1] = &_cffi_type_context;
+    return NULL;
+}
+#  ifdef _MSC_VER
+     PyMODINIT_FUNC
+     PyInit__cvt_geosys(void) { return NULL; }
+#  endif
+#else
 PyMODINIT_FUNC
-init_cvt_geosys(void)
+PyInit__cvt_geosys(void)
 {
-  _cffi_init("geosys._cvt_geosys", 0x2601, &_cffi_type_context);
+  return _cffi_init("geosys._cvt_geosys", 0x2601, &_cffi_type_context);
 }
 #endif
 
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+from pathlib import Path
+from threading import Lock
+from collections import OrderedDict
+from .io_ import load_txt, save_txt, loads_txt, dumps_txt
+
+SQLITE_SUFFIXES = '.db', '.sqlite'
+SQLITE_IN_CHUNK = 512
+NEG_TTL = 7 * 24 * 3600
+NEG_LL_DIGITS = 5
+RECORD_SUFFIX = '.rec'
+
+def dumps_record(rec):
+    # numpy arrays of a record are kept as lists
+    return json.dumps(rec, default=lambda a: a.tolist())
+
+class DirStore:
+    """
+    one file per pano in a directory, named by the pano id with fmt suffix.
+    the compact parsed record of a pano is kept next to it in a .rec file.
+    """
+    def __init__(self, d, fmt):
+        self.d = Path(d)
+        self.d.mkdir(exist_ok=True)
+        self.fmt = fmt
+
+    def path(self, key):
+        return (self.d / key).with_suffix(self.fmt)
+
+    def __contains__(self, key):
+        return self.path(key).exists()
+
+    def contains_many(self, keys):
+        return {i for i in keys if i in self}
+
+    def get(self, key):
+        f = self.path(key)
+        if f.exists():
+            return load_txt(f)
+
+    def put(self, key, a):
+        save_txt(a, self.path(key))
+        # a new payload drops the stale record
+        self.record_path(key).unlink(missing_ok=True)
+
+    def record_path(self, key):
+        return self.d / (key + RECORD_SUFFIX)
+
+    def get_record(self, key):
+        f = self.record_path(key)
+        if f.exists():
+            return json.loads(f.read_text())
+
+    def put_record(self, key, rec):
+        self.record_path(key).write_text(dumps_record(rec))
+
+    def close(self):
+        pass
+
+class SqliteStore:
+    """
+    pano payloads in one sqlite file keyed by pano id. next to the raw
+    payload a compact parsed record can be kept, so hits need no re-parse.
+    """
+    def __init__(self, f, fmt):
+        self.f = Path(f)
+        self.fmt = fmt
+        self.lock = Lock()
+        self.db = sqlite3.connect(str(f), check_same_thread=False,
+                                  isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS panos ('
+                        'key TEXT PRIMARY KEY, data BLOB, record TEXT'
+                        ') WITHOUT ROWID')
+
+    def _one(self, sql, *args):
+        with self.lock:
+            return self.db.execute(sql, args).fetchone()
+
+    def __contains__(self, key):
+        return self._one('SELECT 1 FROM panos WHERE key = ?', key) is not None
+
+    def contains_many(self, keys):
+        keys = list(keys)
+        out = set()
+        with self.lock:
+            for i in range(0, len(keys), SQLITE_IN_CHUNK):
+                chunk = keys[i:i + SQLITE_IN_CHUNK]
+                sql = 'SELECT key FROM panos WHERE key IN ({})'.format(
+                    ','.join('?' * len(chunk)))
+                out.update(r[0] for r in self.db.execute(sql, chunk))
+        return out
+
+    def get_raw(self, key):
+        r = self._one('SELECT data FROM panos WHERE key = ?', key)
+        return r and r[0]
+
+    def get(self, key):
+        return loads_txt(self.get_raw(key), self.fmt)
+
+    def put_raw(self, key, data):
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO panos (key, data) VALUES (?, ?) ON CONFLICT(key) '
+                'DO UPDATE SET data = excluded.data, record = NULL', (key, data))
+
+    def put(self, key, a):
+        self.put_raw(key, dumps_txt(a, self.fmt))
+
+    def get_record(self, key):
+        r = self._one('SELECT record FROM panos WHERE key = ?', key)
+        return r and r[0] and json.loads(r[0])
+
+    def put_record(self, key, rec):
+        with self.lock:
+            self.db.execute('UPDATE panos SET record = ? WHERE key = ?',
+                            (dumps_record(rec), key))
+
+    def import_dir(self, d):
+        """
+        load a DirStore cache directory into this store, returns the count
+        """
+        files = Path(d).glob('*' + self.fmt)
+        with self.lock:
+            self.db.execute('BEGIN')
+            cur = self.db.executemany(
+                'INSERT OR IGNORE INTO panos (key, data) VALUES (?, ?)',
+                ((f.stem, f.read_bytes()) for f in files))
+            self.db.execute('COMMIT')
+        return cur.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class LRUCache:
+    """
+    in process lru cache bounded by max_entries and/or max_bytes, where an
+    entry's size is sizeof(value). counts hits, misses and evictions.
+    """
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=None):
+        assert max_bytes is None or sizeof is not None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self.lock:
+            if key in self.items:
+                self.nbytes -= self.items.pop(key)[1]
+            self.items[key] = value, size
+            self.nbytes += size
+            while self.items and (
+                    (self.max_entries is not None
+                     and len(self.items) > self.max_entries)
+                    or (self.max_bytes is not None
+                        and self.nbytes > self.max_bytes)):
+                self.nbytes -= self.items.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.items)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.items), 'bytes': self.nbytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+class NegativeCache:
+    """
+    persistent set of known dead queries, pano ids or (lat, lng) quantized
+    to NEG_LL_DIGITS, each expiring after its own ttl in seconds.
+
+    every add is appended to a log of 'key<tab>expiry' lines and flushed at
+    once, so a crash loses nothing. expired, repeated and torn lines are
+    compacted away on open.
+    """
+    def __init__(self, f, ttl=NEG_TTL):
+        self.f = Path(f)
+        self.ttl = ttl
+        self.items = {}
+        self.lock = Lock()
+
+        nr = 0
+        if self.f.exists():
+            with open(self.f) as fp:
+                for line in fp:
+                    # every line counts, so a torn one forces a compaction
+                    # and is never extended by the next add
+                    nr += 1
+                    k, _, t = line.partition('\t')
+                    if not line.endswith('\n'):
+                        continue
+                    try:
+                        self.items[k] = float(t)
+                    except ValueError:
+                        continue
+            now = time.time()
+            self.items = {k: t for k, t in self.items.items() if t > now}
+            if nr > len(self.items):
+                self._compact()
+        self.fp = open(self.f, 'a')
+
+    def _compact(self):
+        tmp = self.f.with_name(self.f.name + '.tmp')
+        with open(tmp, 'w') as fp:
+            for k, t in self.items.items():
+                print(k, t, sep='\t', file=fp)
+        os.replace(tmp, self.f)
+
+    @staticmethod
+    def key(q):
+        if isinstance(q, str):
+            return q
+        return 'll:{1:.{0}f},{2:.{0}f}'.format(NEG_LL_DIGITS, *q)
+
+    def __contains__(self, q):
+        t = self.items.get(self.key(q))
+        return t is not None and t > time.time()
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, q, ttl=None):
+        k = self.key(q)
+        t = time.time() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.items[k] = t
+            print(k, t, sep='\t', file=self.fp, flush=True)
+
+    def close(self):
+        self.fp.close()
+
+class TileCache:
+    """
+    image tiles on disk keyed by (map_type, id, zoom, tilt, pan). a tile
+    lives at <d>/<map_type>/<h[:2]>/<h>, h the sha1 of the rest of the key,
+    and is written aside then renamed, so a crash never leaves a partial
+    tile behind.
+    """
+    def __init__(self, d):
+        self.d = Path(d)
+
+    def path(self, key):
+        map_type, *rest = key
+        h = hashlib.sha1('/'.join(map(str, rest)).encode()).hexdigest()
+        return self.d / map_type / h[:2] / h
+
+    def __contains__(self, key):
+        return self.path(key).exists()
+
+    def get(self, key):
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            return
+
+    def put(self, key, data):
+        f = self.path(key)
+        f.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=f.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, f)
+
+    def discard(self, key):
+        self.path(key).unlink(missing_ok=True)
+
+def open_store(path, fmt):
+    path = Path(path)
+    if path.suffix in SQLITE_SUFFIXES:
+        return SqliteStore(path, fmt)
+    return DirStore(path, fmt)
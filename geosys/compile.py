@@ -5,11 +5,33 @@ import cffi
 cur_d = Path(__file__).parent
 
 builder = cffi.FFI()
-builder.set_source("geosys._cvt_geosys", open(cur_d / "cvt_geosys_mpl.c").read())
+builder.set_source("geosys._cvt_geosys", "".join(
+    open(cur_d / i).read() for i in ("cvt_geosys_mpl.c", "cvt_geosys_batch.c")))
 builder.cdef("""
 void wgs84_to_gcj02 (double y, double x, double *out);
 void wgs84_to_gcj02_jac (double y, double x, double *out);
+int gcj02_to_wgs84_newton (double y, double x, double tol, int max_iter,
+                           double *out);
+void gcj02_to_bd09 (double y, double x, double *out);
 void bd09_to_gcj02 (double y, double x, double *out);
+void wgs84_to_bd09 (double y, double x, int in_china, double *out);
+int bd09_to_wgs84 (double y, double x, int in_china, double tol, int max_iter,
+                   double *out);
+
+void wgs84_to_gcj02_n (const double *y, const double *x, const char *mask,
+                       long n, double *out_y, double *out_x);
+void gcj02_to_wgs84_n (const double *y, const double *x, const char *mask,
+                       long n, double tol, int max_iter, char *converged,
+                       double *out_y, double *out_x);
+void gcj02_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x);
+void bd09_to_gcj02_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x);
+void wgs84_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x);
+void bd09_to_wgs84_n (const double *y, const double *x, const char *mask,
+                      long n, double tol, int max_iter, char *converged,
+                      double *out_y, double *out_x);
 """)
 
 if __name__ == "__main__":
@@ -1,10 +1,11 @@
 from pathlib import Path
 import json
 import math as M
-from Polygon import Polygon
-from geopy.distance import geodesic
+import numpy as np
+from geographiclib.geodesic import Geodesic
 from scipy.optimize import leastsq
 from ._cvt_geosys import ffi, lib
+from .poly_index import PolygonIndex
 
 cur_d = Path(__file__).parent
 
@@ -24,11 +25,21 @@ def wgs84_to_gcj02_jac(y, x):
     lib.wgs84_to_gcj02_jac(y, x, out)
     return [[out[0], out[2]], [out[1], out[3]]]
 
+def gcj02_to_bd09(y, x):
+    out = ffi.new('double[2]')
+    lib.gcj02_to_bd09(y, x, out)
+    return tuple(out)
+
+def bd09_to_gcj02(y, x):
+    out = ffi.new('double[2]')
+    lib.bd09_to_gcj02(y, x, out)
+    return tuple(out)
+
 def transform_point(T, X):
     return T[:, :-1].dot(X) + T[:, -1]
 
 def geo_dist(lat0, lng0, lat1, lng1):
-    return geodesic((lat0, lng0), (lat1, lng1)).meters
+    return Geodesic.WGS84.Inverse(lat0, lng0, lat1, lng1, Geodesic.DISTANCE)['s12']
 
 def geo_coord(lat, lng, clat=0, clng=0):
     return ((1 if lat > clat else -1) * geo_dist(lat, lng, clat, lng),
@@ -36,16 +47,26 @@ def geo_coord(lat, lng, clat=0, clng=0):
 
 
 cache = {}
-def in_china(y, x):
+def load_china_borders():
     if 'china_borders' not in cache:
         cache['china_borders'] = json.load(open(cur_d / 'china_borders.json'))
+    return cache['china_borders']
 
-    return any(Polygon(b).isInside(y, x) for b in cache['china_borders'])
+def china_index():
+    if 'china_index' not in cache:
+        cache['china_index'] = PolygonIndex(load_china_borders())
+    return cache['china_index']
+
+def in_china(y, x):
+    return china_index().contains(y, x)
+
+def in_china_batch(y, x):
+    return china_index().contains_many(y, x)
 
 def check_in_china_fn(fn):
-    def __fn(y, x):
+    def __fn(y, x, *args, **kws):
         if in_china(y, x):
-            return fn(y, x)
+            return fn(y, x, *args, **kws)
         else:
             return y, x
     return __fn
@@ -53,10 +74,10 @@ def check_in_china_fn(fn):
 
 wgs84_to_gcj02 = check_in_china_fn(wgs84_to_gcj02)
 
-def __gcj02_to_wgs84(y0, x0):
+def __gcj02_to_wgs84_leastsq(y0, x0):
     """
     >>> gcj02, wgs84 = (39.906961, 116.397555), (39.905560, 116.391314)
-    >>> ok(__gcj02_to_wgs84(*gcj02), wgs84, 1e-6)
+    >>> ok(__gcj02_to_wgs84_leastsq(*gcj02), wgs84, 1e-6)
     """
     def wgs84_to_gcj02_fvec(x):
         y1, x1 = wgs84_to_gcj02(*x)
@@ -69,8 +90,116 @@ def __gcj02_to_wgs84(y0, x0):
     return x.tolist()
 
 
+# residual in degrees, 1e-12 is about 0.1um
+GCJ02_INV_TOL = 1e-12
+GCJ02_INV_MAX_ITER = 8
+
+def __gcj02_to_wgs84_newton(y, x, tol=GCJ02_INV_TOL, max_iter=GCJ02_INV_MAX_ITER):
+    out = ffi.new('double[2]')
+    lib.gcj02_to_wgs84_newton(y, x, tol, max_iter, out)
+    return list(out)
+
+
+_gcj02_inv_methods = {
+    'newton': __gcj02_to_wgs84_newton,
+    'leastsq': __gcj02_to_wgs84_leastsq,
+}
+
+def __gcj02_to_wgs84(y, x, method='newton'):
+    return _gcj02_inv_methods[method](y, x)
+
+
 gcj02_to_wgs84 = check_in_china_fn(__gcj02_to_wgs84)
 
+# chained in C, the china test is on the input point
+def wgs84_to_bd09(y, x):
+    out = ffi.new('double[2]')
+    lib.wgs84_to_bd09(y, x, in_china(y, x), out)
+    return tuple(out)
+
+def bd09_to_wgs84(y, x, tol=GCJ02_INV_TOL, max_iter=GCJ02_INV_MAX_ITER):
+    out = ffi.new('double[2]')
+    lib.bd09_to_wgs84(y, x, in_china(y, x), tol, max_iter, out)
+    return list(out)
+
+def _as_batch(y, x):
+    y, x = np.broadcast_arrays(np.asarray(y, dtype=np.float64),
+                               np.asarray(x, dtype=np.float64))
+    return (np.require(y, requirements='C').reshape(-1),
+            np.require(x, requirements='C').reshape(-1))
+
+def _dbuf(a):
+    return ffi.from_buffer('double[]', a)
+
+def _out_buf(a, shape):
+    if (a is not None and a.dtype == np.float64 and a.shape == shape
+            and a.flags.c_contiguous and a.flags.writeable):
+        return a.reshape(-1)
+    return np.empty(shape).reshape(-1)
+
+def _batch_call(fn, y, x, *args, check_china=True, out=None):
+    # out=(y, x) buffers are written in place when they are contiguous
+    # float64 arrays of the result shape, which may be the inputs
+    shape = np.broadcast(y, x).shape
+    y, x = _as_batch(y, x)
+    out_y, out_x = out or (None, None)
+    oy, ox = _out_buf(out_y, shape), _out_buf(out_x, shape)
+    mask = ffi.NULL
+    if check_china:
+        mask = in_china_batch(y, x).view(np.int8)
+        mask = ffi.from_buffer('char[]', mask)
+    fn(_dbuf(y), _dbuf(x), mask, y.size, *args, _dbuf(oy), _dbuf(ox))
+    if out is None:
+        return oy.reshape(shape), ox.reshape(shape)
+    for o, r in zip(out, (oy, ox)):
+        if not np.shares_memory(o, r):
+            o[...] = r.reshape(shape)
+    return out
+
+def wgs84_to_gcj02_batch(y, x, check_china=True, out=None):
+    """
+    array version of wgs84_to_gcj02, returns (y, x) arrays in the broadcast
+    shape of the inputs. points outside china are passed through.
+    """
+    return _batch_call(lib.wgs84_to_gcj02_n, y, x, check_china=check_china,
+                       out=out)
+
+def gcj02_to_wgs84_batch(y, x, check_china=True, tol=GCJ02_INV_TOL,
+                         max_iter=GCJ02_INV_MAX_ITER, full_output=False,
+                         out=None):
+    """
+    array version of gcj02_to_wgs84, solved by newton steps on the analytic
+    jacobian. stops when the residual is below tol degrees, with
+    full_output also returns the per point convergence mask.
+    """
+    converged = np.empty(np.broadcast(y, x).shape, dtype=bool)
+    out = _batch_call(lib.gcj02_to_wgs84_n, y, x, tol, max_iter,
+                      ffi.from_buffer('char[]', converged.view(np.int8)),
+                      check_china=check_china, out=out)
+    if full_output:
+        return tuple(out) + (converged,)
+    return out
+
+def gcj02_to_bd09_batch(y, x):
+    return _batch_call(lib.gcj02_to_bd09_n, y, x, check_china=False)
+
+def bd09_to_gcj02_batch(y, x):
+    return _batch_call(lib.bd09_to_gcj02_n, y, x, check_china=False)
+
+def wgs84_to_bd09_batch(y, x, check_china=True):
+    return _batch_call(lib.wgs84_to_bd09_n, y, x, check_china=check_china)
+
+def bd09_to_wgs84_batch(y, x, check_china=True, tol=GCJ02_INV_TOL,
+                        max_iter=GCJ02_INV_MAX_ITER, full_output=False):
+    converged = np.empty(np.broadcast(y, x).shape, dtype=bool)
+    out = _batch_call(lib.bd09_to_wgs84_n, y, x, tol, max_iter,
+                      ffi.from_buffer('char[]', converged.view(np.int8)),
+                      check_china=check_china)
+    if full_output:
+        return out + (converged,)
+    return out
+
+
 EARTH_CIRCUM = 2 * M.pi * EARTH_R_MAJOR
 
 def _check_lat(lat):
@@ -0,0 +1,173 @@
+/* array loops over the generated kernels in cvt_geosys_mpl.c, which is
+   prepended by compile.py. mask may be NULL, out may alias the input. */
+
+void wgs84_to_gcj02_n (const double *y, const double *x, const char *mask,
+                       long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    wgs84_to_gcj02(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+/* newton iteration on f(w) = g with the analytic jacobian, returns 1 when
+   the residual drops below tol (degrees) within max_iter steps. a converged
+   point gets one more step, kept only if it does not increase the residual,
+   to settle on the last ulp. */
+int gcj02_to_wgs84_newton (double y, double x, double tol, int max_iter,
+                           double *ret)
+{
+  double f[2], j[4], w[2], ry, rx, det, r, r_ok = -1;
+  int k;
+  w[0] = y;
+  w[1] = x;
+  for (k = 0; ; k++) {
+    wgs84_to_gcj02(w[0], w[1], f);
+    ry = f[0] - y;
+    rx = f[1] - x;
+    r = fmax(fabs(ry), fabs(rx));
+    if (r_ok >= 0) {
+      if (r <= r_ok) {
+        ret[0] = w[0];
+        ret[1] = w[1];
+      }
+      return 1;
+    }
+    ret[0] = w[0];
+    ret[1] = w[1];
+    if (r <= tol)
+      r_ok = r;
+    else if (k >= max_iter)
+      return 0;
+    if (r == 0)
+      return 1;
+    /* j is column major: d(y, x)/dy, d(y, x)/dx */
+    wgs84_to_gcj02_jac(w[0], w[1], j);
+    det = j[0] * j[3] - j[2] * j[1];
+    if (isfinite(det) && det != 0) {
+      w[0] -= (j[3] * ry - j[2] * rx) / det;
+      w[1] -= (j[0] * rx - j[1] * ry) / det;
+    }
+    else {
+      /* the sqrt(|x - 105|) term has no derivative at x = 105 */
+      w[0] -= ry;
+      w[1] -= rx;
+    }
+  }
+}
+
+void gcj02_to_wgs84_n (const double *y, const double *x, const char *mask,
+                       long n, double tol, int max_iter, char *converged,
+                       double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  char ok;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      ok = 1;
+    }
+    else {
+      ok = gcj02_to_wgs84_newton(y[i], x[i], tol, max_iter, ret);
+      out_y[i] = ret[0];
+      out_x[i] = ret[1];
+    }
+    if (converged)
+      converged[i] = ok;
+  }
+}
+
+/* bd09 chains, in_china selects whether the gcj02 offset applies */
+void wgs84_to_bd09 (double y, double x, int in_china, double *ret)
+{
+  double g[2] = {y, x};
+  if (in_china)
+    wgs84_to_gcj02(y, x, g);
+  gcj02_to_bd09(g[0], g[1], ret);
+}
+
+int bd09_to_wgs84 (double y, double x, int in_china, double tol, int max_iter,
+                   double *ret)
+{
+  double g[2];
+  bd09_to_gcj02(y, x, g);
+  if (!in_china) {
+    ret[0] = g[0];
+    ret[1] = g[1];
+    return 1;
+  }
+  return gcj02_to_wgs84_newton(g[0], g[1], tol, max_iter, ret);
+}
+
+void gcj02_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    gcj02_to_bd09(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+void bd09_to_gcj02_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    if (mask && !mask[i]) {
+      out_y[i] = y[i];
+      out_x[i] = x[i];
+      continue;
+    }
+    bd09_to_gcj02(y[i], x[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+/* here mask is the china mask, the bd09 offset applies to every point */
+void wgs84_to_bd09_n (const double *y, const double *x, const char *mask,
+                      long n, double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  for (i = 0; i < n; i++) {
+    wgs84_to_bd09(y[i], x[i], !mask || mask[i], ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+  }
+}
+
+void bd09_to_wgs84_n (const double *y, const double *x, const char *mask,
+                      long n, double tol, int max_iter, char *converged,
+                      double *out_y, double *out_x)
+{
+  double ret[2];
+  long i;
+  char ok;
+  for (i = 0; i < n; i++) {
+    ok = bd09_to_wgs84(y[i], x[i], !mask || mask[i], tol, max_iter, ret);
+    out_y[i] = ret[0];
+    out_x[i] = ret[1];
+    if (converged)
+      converged[i] = ok;
+  }
+}
@@ -35,7 +35,7 @@ void wgs84_to_gcj02 (double y, double x, double *ret)
   t4 = t3 * t3;
   t6 = x - 0.1050e3;
   t8 = 0.1e0 * t6 * t3;
-  t9 = sqrt(t6);
+  t9 = sqrt(fabs(t6));
   t11 = t6 * 0.3141592654e1;
   t13 = sin(0.60e1 * t11);
   t14 = 0.1333333333e2 * t13;
@@ -141,7 +141,7 @@ void wgs84_to_gcj02_jac (double y, double x, double *ret)
   t35 = t3 * t3;
   t37 = x - 0.1050e3;
   t39 = 0.1e0 * t37 * t3;
-  t40 = sqrt(t37);
+  t40 = sqrt(fabs(t37));
   t42 = t37 * 0.3141592654e1;
   t43 = 0.60e1 * t42;
   t44 = sin(t43);
@@ -167,7 +167,7 @@ void wgs84_to_gcj02_jac (double y, double x, double *ret)
   t85 = 0.12500e3 + x + 0.20e1 * y + 0.1e0 * t71 + t39 + 0.1e0 * t40 + t45 + t48 + 0.1333333333e2 * t74 + 0.2666666667e2 * t77 + 0.1000000000e3 * t80 + 0.2000000000e3 * t83;
   t91 = t59 * t59;
   t97 = 0.1e0 * y;
-  t98 = 0.1e1 / t40;
+  t98 = (t37 < 0.0e0 ? -0.1e1 : 0.1e1) / t40;
   t100 = cos(t43);
   t102 = 0.7999999998e2 * t100 * 0.3141592654e1;
   t103 = cos(t46);
@@ -0,0 +1,186 @@
+from functools import lru_cache
+import numpy as np
+from geographiclib.geodesic import Geodesic
+from .cvt_geosys import EARTH_R_MAJOR, EARTH_FLATTENING
+
+EARTH_E2 = EARTH_FLATTENING * (2 - EARTH_FLATTENING)
+EARTH_B = EARTH_R_MAJOR * (1 - EARTH_FLATTENING)
+EARTH_N = EARTH_FLATTENING / (2 - EARTH_FLATTENING)
+
+VINCENTY_TOL = 1e-12
+VINCENTY_MAX_ITER = 200
+
+def _as_arrays(*a):
+    a = np.broadcast_arrays(*[np.asarray(i, dtype=np.float64) for i in a])
+    return a[0].shape, [i.reshape(-1) for i in a]
+
+def _karney(lat0, lng0, lat1, lng1):
+    g = Geodesic.WGS84
+    out = np.empty(lat0.shape)
+    for i, p in enumerate(zip(lat0.flat, lng0.flat, lat1.flat, lng1.flat)):
+        out.flat[i] = g.Inverse(*p, Geodesic.DISTANCE)['s12']
+    return out
+
+def _vincenty(lat0, lng0, lat1, lng1):
+    a, b, f = EARTH_R_MAJOR, EARTH_B, EARTH_FLATTENING
+    L = np.radians((lng1 - lng0 + 180) % 360 - 180)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat0)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L
+    done = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITER):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_s = np.hypot(cosU2 * sin_lam,
+                             cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_s = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_s, cos_s)
+            sin_a = np.where(sin_s == 0, 0, cosU1 * cosU2 * sin_lam / sin_s)
+            cos2_a = 1 - sin_a**2
+            cos_2sm = np.where(cos2_a == 0, 0,
+                               cos_s - 2 * sinU1 * sinU2 / cos2_a)
+            C = f / 16 * cos2_a * (4 + f * (4 - 3 * cos2_a))
+            lam1 = L + (1 - C) * f * sin_a * (
+                sigma + C * sin_s * (cos_2sm + C * cos_s * (2 * cos_2sm**2 - 1)))
+            done = np.abs(lam1 - lam) < VINCENTY_TOL
+            lam = lam1
+            if done.all():
+                break
+
+        u2 = cos2_a * (a * a - b * b) / (b * b)
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        d_sigma = B * sin_s * (cos_2sm + B / 4 * (
+            cos_s * (2 * cos_2sm**2 - 1)
+            - B / 6 * cos_2sm * (4 * sin_s**2 - 3) * (4 * cos_2sm**2 - 3)))
+        out = b * A * (sigma - d_sigma)
+
+    # vincenty fails to converge for nearly antipodal points
+    bad = ~done | ~np.isfinite(out)
+    if bad.any():
+        out[bad] = _karney(lat0[bad], lng0[bad], lat1[bad], lng1[bad])
+    return out
+
+def ll_radii(lat):
+    """
+    meridional and prime vertical radii of curvature in meters at lat
+    """
+    s2 = np.sin(np.radians(lat))**2
+    w = np.sqrt(1 - EARTH_E2 * s2)
+    return EARTH_R_MAJOR * (1 - EARTH_E2) / w**3, EARTH_R_MAJOR / w
+
+def meridian_arc(lat):
+    """
+    distance in meters along the meridian from the equator to lat, helmert's
+    series, accurate to well below 1mm
+    """
+    n = EARTH_N
+    p = np.radians(lat)
+    return EARTH_R_MAJOR / (1 + n) * (
+        (1 + n**2 / 4 + n**4 / 64) * p
+        - 1.5 * (n - n**3 / 8) * np.sin(2 * p)
+        + 15 / 16 * (n**2 - n**4 / 4) * np.sin(4 * p)
+        - 35 / 48 * n**3 * np.sin(6 * p)
+        + 315 / 512 * n**4 * np.sin(8 * p))
+
+def parallel_arc(lat, dlng):
+    return ll_radii(lat)[1] * np.cos(np.radians(lat)) * np.radians(
+        (dlng + 180) % 360 - 180)
+
+def _ltp_delta(lat0, lng0, lat1, lng1):
+    rm, rn = ll_radii((lat0 + lat1) / 2)
+    dy = rm * np.radians(lat1 - lat0)
+    dx = rn * np.cos(np.radians((lat0 + lat1) / 2)) * np.radians(
+        (lng1 - lng0 + 180) % 360 - 180)
+    return dy, dx
+
+def _ltp(lat0, lng0, lat1, lng1):
+    return np.hypot(*_ltp_delta(lat0, lng0, lat1, lng1))
+
+
+# 'ltp' treats the ellipsoid as flat around the mid point with the local
+# radii of curvature. up to 60 degrees latitude the error against karney
+# is below 5um for 1km spans, 5mm for 10km and 0.5m for 50km, growing with
+# the cube of the span, so it is meant for local tracks only.
+GEO_DIST_METHODS = {
+    'karney': _karney,
+    'vincenty': _vincenty,
+    'ltp': _ltp,
+}
+
+def geo_dist_batch(lat0, lng0, lat1, lng1, method='karney'):
+    """
+    geodesic distances in meters between arrays of points on WGS-84.
+    method is 'karney' (exact), 'vincenty' (vectorized, sub-mm) or 'ltp'
+    (local tangent plane approximation).
+    """
+    shape, (lat0, lng0, lat1, lng1) = _as_arrays(lat0, lng0, lat1, lng1)
+    return GEO_DIST_METHODS[method](lat0, lng0, lat1, lng1).reshape(shape)
+
+def geo_coord_batch(lat, lng, clat=0, clng=0, method='karney'):
+    """
+    array version of cvt_geosys.geo_coord, signed (north, east) offsets in
+    meters of the points from (clat, clng)
+    """
+    shape, (lat, lng, clat, clng) = _as_arrays(lat, lng, clat, clng)
+    if method == 'ltp':
+        # same legs as geo_coord: along the meridian of the point, then
+        # along its parallel
+        y = meridian_arc(lat) - meridian_arc(clat)
+        x = parallel_arc(lat, lng - clng)
+    else:
+        fn = GEO_DIST_METHODS[method]
+        y = np.where(lat > clat, 1, -1) * fn(lat, lng, clat, lng)
+        x = np.where(lng > clng, 1, -1) * fn(lat, lng, lat, clng)
+    return y.reshape(shape), x.reshape(shape)
+
+
+LL2XYZ_CHUNK = 1 << 16
+
+@lru_cache(maxsize=64)
+def _ll2xyz_consts(anchor, T, shape, method):
+    clat, clng = anchor
+    T = np.frombuffer(T).reshape(shape)
+    # rows act on [east, elev, north], matching apply_ll2xyz's (x, -elev, z)
+    A = T[:, :-1].T * np.array([[1], [-1], [1]])
+    arc0 = meridian_arc(clat) if method == 'ltp' else None
+    return clat, clng, arc0, A, T[:, -1].copy()
+
+def apply_ll2xyz_batch(trans, lat, lng, elev=0, method='ltp', out=None,
+                       chunk=LL2XYZ_CHUNK):
+    """
+    array version of cvt_geosys.apply_ll2xyz. T is (k, 4), like the 3x4
+    [R|t] or a 4x4 homogeneous matrix, and the result an (N, k) array.
+
+    inputs may be memory mapped (np.load(f, mmap_mode='r')), they are read
+    chunk points at a time and written into out, which may be a memmap too.
+    'ltp' uses an exact meridian arc and the parallel arc of the point,
+    'karney' and 'vincenty' follow geo_coord_batch.
+    """
+    anchor, T = trans
+    T = np.ascontiguousarray(T, dtype=np.float64)
+    assert T.ndim == 2 and T.shape[1] == 4, \
+        'T must be a (k, 4) matrix, not {}'.format(T.shape)
+    clat, clng, arc0, A, t = _ll2xyz_consts(
+        tuple(float(i) for i in anchor), T.tobytes(), T.shape, method)
+
+    lat, lng, elev = np.broadcast_arrays(np.atleast_1d(lat), lng, elev)
+    n = len(lat)
+    if out is None:
+        out = np.empty((n, len(T)))
+
+    for i in range(0, n, chunk):
+        la = np.asarray(lat[i:i + chunk], dtype=np.float64)
+        ln = np.asarray(lng[i:i + chunk], dtype=np.float64)
+        if method == 'ltp':
+            z = meridian_arc(la) - arc0
+            x = parallel_arc(la, ln - clng)
+        else:
+            z, x = geo_coord_batch(la, ln, clat, clng, method=method)
+        enu = np.stack([x, elev[i:i + chunk], z], 1)
+        np.matmul(enu, A, out=out[i:i + chunk])
+        out[i:i + chunk] += t
+
+    return out
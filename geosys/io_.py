@@ -1,16 +1,23 @@
 import os
 import json
+import pickle
+from functools import partial
 from lxml import etree
-from .utils import fix_xml_error
+from .utils import fix_xml_error_iter
+
+XML_CHUNK = 1 << 16
 
 def load_xml(f, fix_err=False):
     f = str(f)
     if not fix_err:
         return etree.parse(f)
 
-    s = open(f).read()
-    s = fix_xml_error(s)
-    return etree.fromstring(s)
+    # fixed chunk by chunk while feeding the parser
+    parser = etree.XMLParser()
+    with open(f, 'rb') as fp:
+        for s in fix_xml_error_iter(iter(partial(fp.read, XML_CHUNK), b'')):
+            parser.feed(s)
+    return parser.close()
 
 def load_txt(f):
     if os.stat(f).st_size == 0:
@@ -20,6 +27,22 @@ def load_txt(f):
     elif f.suffix == '.xml':
         return load_xml(f)
 
+def loads_txt(s, fmt):
+    if not s:
+        return
+    if fmt == '.json':
+        return json.loads(s)
+    elif fmt == '.xml':
+        return etree.fromstring(s)
+
+def dumps_txt(a, fmt):
+    if fmt == '.json':
+        return json.dumps(a).encode()
+    elif fmt == '.xml':
+        return etree.tostring(a, xml_declaration=True)
+    else:
+        raise
+
 def save_xml(a, f):
     open(f, 'wb').write(etree.tostring(
         a, pretty_print=True, xml_declaration=True))
@@ -33,3 +56,23 @@ def save_txt(a, f, *args, **kws):
 
     else:
         raise
+
+def iter_lines(fp):
+    """
+    stripped non empty lines of a text stream, '#' comments skipped
+    """
+    for line in fp:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def save_pickle(a, f):
+    # written aside and renamed, a crash never leaves a partial file
+    tmp = str(f) + '.tmp'
+    with open(tmp, 'wb') as fp:
+        pickle.dump(a, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, f)
+
+def load_pickle(f):
+    with open(f, 'rb') as fp:
+        return pickle.load(fp)
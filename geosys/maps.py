@@ -1,6 +1,8 @@
 import math as M
-from shapely.geometry import Point
+import numpy as np
+from lxml import etree
 from .cvt_geosys import gcj02_to_wgs84, wgs84_to_gcj02
+from .proj import QMAP_K0, QMAP_K1, QMAP_K2, qmap_yx2ll as qmap_yx2ll_batch
 
 MAP_TYPES = ['qmap']
 QMAP_PANO_ADDR = 'http://sv.map.qq.com'
@@ -28,10 +30,6 @@ GMAP_PANO_IMG_URL = \
     "http://geo{server}.ggpht.com/cbk?"\
     "output=tile&panoid={id}&x={pan}&y={tilt}&zoom={zoom}"
 
-QMAP_K0 = 111319.49077777778
-QMAP_K1 = 0.008726646259971648
-QMAP_K2 = 0.017453292519943295
-
 def qmap_ll2yx(lat, lng, is_gcj02=True):
     if is_gcj02:
         lat, lng = wgs84_to_gcj02(lat, lng)
@@ -46,35 +44,81 @@ def qmap_yx2ll(y, x, is_gcj02=True):
         lat, lng = gcj02_to_wgs84(lat, lng)
     return lat, lng
 
-def qmap_parse_pano_info(pano, bnd=None):
-    if pano is None or pano.find('error') is not None:
+
+QMAP_RECORD_TAGS = 'error', 'addr', 'basic', 'all_scene'
+QMAP_PARSE_CHUNK = 1 << 14
+
+def _qmap_elems(pano):
+    if not isinstance(pano, (bytes, bytearray, memoryview)):
+        yield from pano.iter(*QMAP_RECORD_TAGS)
         return
 
-    addr = pano.xpath('addr')
-    if len(addr) == 0:
+    # the attributes are complete at the start tag, the rest of the
+    # document is never needed
+    parser = etree.XMLPullParser(events=('start',), tag=QMAP_RECORD_TAGS)
+    pano = memoryview(pano)
+    for i in range(0, len(pano), QMAP_PARSE_CHUNK):
+        parser.feed(bytes(pano[i:i + QMAP_PARSE_CHUNK]))
+        for _, e in parser.read_events():
+            yield e
+    parser.close()
+    for _, e in parser.read_events():
+        yield e
+
+def qmap_pano_record(pano):
+    """
+    pull addr, basic and all_scene attributes of a qmap pano, an lxml
+    element or the xml bytes, in one pass. returns {'id', 'lat', 'lng',
+    'dir', 'links', 'link_y', 'link_x'} with wgs84 lat/lng and the linked
+    scenes in qmap mercator, or None for a missing pano.
+    """
+    if pano is None:
+        return
+    addr = basic = None
+    links, ys, xs = [], [], []
+    for e in _qmap_elems(pano):
+        tag = e.tag
+        if tag == 'all_scene':
+            links.append(e.get('svid'))
+            ys.append(e.get('y'))
+            xs.append(e.get('x'))
+        elif tag == 'error':
+            return
+        elif tag == 'addr' and addr is None:
+            addr = float(e.get('y_lat')), float(e.get('x_lng'))
+        elif tag == 'basic' and basic is None:
+            basic = e.get('svid'), M.radians(float(e.get('dir')))
+    if addr is None:
         return
-    addr = addr[0]
 
-    basic_info = pano.xpath('basic')[0]
-    pid = basic_info.get('svid')
+    lat, lng = gcj02_to_wgs84(*addr)
+    return {
+        'id': basic[0], 'lat': lat, 'lng': lng, 'dir': basic[1],
+        'links': links,
+        'link_y': np.array(ys, dtype=np.float64),
+        'link_x': np.array(xs, dtype=np.float64),
+    }
 
-    this_lat, this_lng = gcj02_to_wgs84(
-        float(addr.get('y_lat')), float(addr.get('x_lng')))
-    dir_ = M.radians(float(basic_info.get('dir')))
+def qmap_parse_pano_info(pano, bnd=None):
+    """
+    pano is what qmap_pano_record takes, or a record it returned. bnd keeps
+    the links inside it, any object with contains_many(lats, lngs) like a
+    PolygonIndex
+    """
+    r = pano if isinstance(pano, dict) else qmap_pano_record(pano)
+    if r is None:
+        return
 
-    links = []
-    for i in pano.xpath('all_scenes/all_scene'):
-        if bnd:
-            lat, lng = qmap_yx2ll(float(i.get('y')), float(i.get('x')))
-            if bnd.contains(Point(lat, lng)):
-                links.append(i.get('svid'))
-        else:
-            links.append(i.get('svid'))
+    links = r['links']
+    if bnd is not None and links:
+        keep = bnd.contains_many(*qmap_yx2ll_batch(r['link_y'], r['link_x']))
+        links = [i for i, k in zip(links, keep) if k]
 
+    pid = r['id']
     return {
         'pano': {
-            'id': pid, 'latlng': [this_lat, this_lng], 'date': pid[8:14],
-            'ori': [dir_, 0, 0],
+            'id': pid, 'latlng': [r['lat'], r['lng']], 'date': pid[8:14],
+            'ori': [r['dir'], 0, 0],
         },
         'links': links
     }
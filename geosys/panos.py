@@ -0,0 +1,162 @@
+"""
+crawled pano records, in memory as PanoRecord and on disk as a directory
+of .npy columns that can be memory mapped one at a time
+"""
+from pathlib import Path
+import numpy as np
+from scipy.spatial import cKDTree
+import yaml
+from .cvt_geosys import EARTH_R_MAJOR, EARTH_R_MINOR
+
+PANO_COLUMNS = 'id', 'lat', 'lng', 'date', 'ori'
+PANO_DIR_SUFFIX = '.panos'
+# unit sphere positions of the panos, derived from lat and lng
+PANO_XYZ = 'xyz.npy'
+EARTH_R_MEAN = (2 * EARTH_R_MAJOR + EARTH_R_MINOR) / 3
+
+class PanoRecord:
+    __slots__ = PANO_COLUMNS
+
+    def __init__(self, id, lat, lng, date='N/A', ori=(0, 0, 0)):
+        self.id = id
+        self.lat = lat
+        self.lng = lng
+        self.date = date
+        self.ori = tuple(ori)
+
+    @classmethod
+    def from_info(cls, p):
+        """
+        from the 'pano' dict of get_pano, with latlng or lat and lng
+        """
+        lat, lng = p['latlng'] if 'latlng' in p else (p['lat'], p['lng'])
+        return cls(p['id'], lat, lng, p.get('date', 'N/A'), p.get('ori', (0, 0, 0)))
+
+    def to_dict(self):
+        return {'id': self.id, 'latlng': [self.lat, self.lng], 'date': self.date,
+                'ori': list(self.ori)}
+
+    def __getstate__(self):
+        return tuple(getattr(self, i) for i in PANO_COLUMNS)
+
+    def __setstate__(self, state):
+        for k, v in zip(PANO_COLUMNS, state):
+            setattr(self, k, v)
+
+    def __eq__(self, o):
+        return self.__getstate__() == o.__getstate__()
+
+    def __repr__(self):
+        return 'PanoRecord({})'.format(', '.join(map(repr, self.__getstate__())))
+
+def is_pano_dir(f):
+    return Path(f).suffix == PANO_DIR_SUFFIX
+
+def save_panos(records, d):
+    """
+    write records into directory d, one .npy per column. ids and dates are
+    ascii bytes, ori is (N, 3).
+    """
+    d = Path(d)
+    d.mkdir(parents=True, exist_ok=True)
+    cols = {
+        'id': np.array([r.id.encode() for r in records], dtype=np.bytes_),
+        'lat': np.array([r.lat for r in records], dtype=np.float64),
+        'lng': np.array([r.lng for r in records], dtype=np.float64),
+        'date': np.array([r.date.encode() for r in records], dtype=np.bytes_),
+        'ori': np.array([r.ori for r in records], dtype=np.float64).reshape(-1, 3),
+    }
+    for k, v in cols.items():
+        np.save(d / (k + '.npy'), v)
+    (d / PANO_XYZ).unlink(missing_ok=True)
+
+def load_pano_columns(d, columns=PANO_COLUMNS, mmap_mode='r'):
+    d = Path(d)
+    return {k: np.load(d / (k + '.npy'), mmap_mode=mmap_mode) for k in columns}
+
+def load_panos(d):
+    c = load_pano_columns(d, mmap_mode=None)
+    return {i.decode(): PanoRecord(i.decode(), lat, lng, date.decode(), ori)
+            for i, lat, lng, date, ori in zip(
+                c['id'], c['lat'].tolist(), c['lng'].tolist(), c['date'],
+                c['ori'].tolist())}
+
+def iter_pano_ids(f):
+    """
+    pano ids of a pano directory, read lazily from the memory mapped id
+    column, or the keys of a yaml file of pano dicts
+    """
+    if is_pano_dir(f):
+        for i in load_pano_columns(f, columns=('id',))['id']:
+            yield i.decode()
+    else:
+        yield from yaml.safe_load(open(f)).keys()
+
+def dump_panos(records, f):
+    """
+    write records to a pano directory, or to yaml for other suffixes
+    """
+    if is_pano_dir(f):
+        save_panos(records, f)
+        return
+    with open(f, 'w') as fp:
+        print(f"# size {len(records)}", file=fp)
+        yaml.dump({r.id: r.to_dict() for r in records}, fp)
+
+def ll2unit(lat, lng):
+    lat, lng = np.radians(lat), np.radians(lng)
+    c = np.cos(lat)
+    return np.stack([c * np.cos(lng), c * np.sin(lng), np.sin(lat)], -1)
+
+def _chord(meters):
+    if meters >= np.pi * EARTH_R_MEAN:
+        return np.inf
+    return 2 * np.sin(meters / EARTH_R_MEAN / 2)
+
+def _arc(chord):
+    with np.errstate(invalid='ignore'):
+        return np.where(np.isinf(chord), np.inf,
+                        2 * EARTH_R_MEAN * np.arcsin(np.minimum(chord / 2, 1)))
+
+class PanoIndex:
+    """
+    nearest pano lookups over a pano directory. the unit sphere xyz of the
+    panos is saved in the directory on first use and memory mapped after
+    that. the kd-tree is built over the mapped array without copying it.
+    distances are meters along a sphere of the mean earth radius. against
+    the geodesic they are up to 0.56% long north-south at the equator, where
+    the meridional radius is smallest, and up to 0.45% short near the poles.
+    """
+    def __init__(self, d):
+        d = Path(d)
+        f = d / PANO_XYZ
+        if not f.exists():
+            c = load_pano_columns(d, columns=('lat', 'lng'))
+            np.save(f, ll2unit(c['lat'], c['lng']))
+        self.xyz = np.load(f, mmap_mode='r')
+        self.ids = load_pano_columns(d, columns=('id',))['id']
+        # sliding midpoint splits build twice as fast, queries are on par
+        self.tree = cKDTree(self.xyz, copy_data=False, balanced_tree=False,
+                            compact_nodes=False)
+
+    def __len__(self):
+        return len(self.xyz)
+
+    def id(self, i):
+        return self.ids[i].decode()
+
+    def query(self, lats, lngs, k=1, radius=np.inf):
+        """
+        k nearest panos within radius meters of each point, returns
+        (meters, indices) of shape (n, k), inf and len(self) where missing
+        """
+        q = ll2unit(np.atleast_1d(lats), np.atleast_1d(lngs))
+        d, i = self.tree.query(q, k=k, distance_upper_bound=_chord(radius))
+        return _arc(d).reshape(len(q), k), i.reshape(len(q), k)
+
+    def query_radius(self, lats, lngs, radius):
+        """
+        indices of all panos within radius meters of each point
+        """
+        q = ll2unit(np.atleast_1d(lats), np.atleast_1d(lngs))
+        return self.tree.query_ball_point(q, _chord(radius))
@@ -0,0 +1,150 @@
+import numpy as np
+
+POLY_INDEX_GRID = 256
+
+def _rings_edges(rings):
+    edges = []
+    for r in rings:
+        r = np.asarray(r, dtype=np.float64)
+        if len(r) > 1 and (r[0] == r[-1]).all():
+            r = r[:-1]
+        edges.append(np.hstack([r, np.roll(r, -1, axis=0)]))
+    edges = np.vstack(edges)
+    return edges[(edges[:, :2] != edges[:, 2:]).any(1)]
+
+def crossing_parity(edges, y, x):
+    # even-odd rule, ray cast towards +x, vectorized over points
+    out = np.zeros(np.shape(y), dtype=bool)
+    for y0, x0, y1, x1 in edges:
+        # horizontal edges never cross a horizontal ray
+        if y0 == y1:
+            continue
+        cross = (y0 > y) != (y1 > y)
+        out ^= cross & (x < x0 + (x1 - x0) * (y - y0) / (y1 - y0))
+    return out
+
+def _orient(ay, ax, by, bx, cy, cx):
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+def _segments_cross(py, px, qy, qx, edges):
+    ay, ax, by, bx = edges.T
+    o1 = _orient(ay, ax, by, bx, py, px) > 0
+    o2 = _orient(ay, ax, by, bx, qy, qx) > 0
+    # half open on the query segment, so a vertex on it counts once
+    o3 = _orient(py, px, qy, qx, ay, ax) > 0
+    o4 = _orient(py, px, qy, qx, by, bx) > 0
+    return (o1 != o2) & (o3 != o4)
+
+class PolygonIndex:
+    """
+    point in polygon index over rings of (y, x) vertices, combined with the
+    even-odd rule (disjoint rings union, nested rings make holes).
+
+    a query is rejected by the bounding box, then looked up in a grid whose
+    cells are marked outside, inside or boundary. only boundary cells run
+    exact edge tests, against the few edges crossing that cell: the segment
+    from the point to the cell center flips the known center state.
+    """
+    OUT, IN, BOUNDARY = 0, 1, 2
+
+    def __init__(self, rings, grid=POLY_INDEX_GRID):
+        self.edges = edges = _rings_edges(rings)
+        pts = edges[:, :2]
+        self.y0, self.x0 = pts.min(0)
+        self.y1, self.x1 = pts.max(0)
+        self.ny = self.nx = grid
+        self.dy = (self.y1 - self.y0) / grid or 1.0
+        self.dx = (self.x1 - self.x0) / grid or 1.0
+
+        cell_edges = self._rasterize_edges()
+        cells = np.arange(grid * grid)
+        cy = self.y0 + (cells // grid + 0.5) * self.dy
+        cx = self.x0 + (cells % grid + 0.5) * self.dx
+        self.center_y, self.center_x = cy, cx
+        self.center_in = crossing_parity(edges, cy, cx)
+
+        state = np.where(self.center_in, self.IN, self.OUT).astype(np.int8)
+        cnt = np.bincount(cell_edges[:, 0], minlength=grid * grid)
+        state[cnt > 0] = self.BOUNDARY
+        self.state = state
+
+        order = np.argsort(cell_edges[:, 0], kind='stable')
+        self.cell_edge_ids = cell_edges[order, 1]
+        self.cell_start = np.concatenate([[0], np.cumsum(cnt)])
+
+    def _rasterize_edges(self):
+        # conservative: every cell the segment passes through, column by
+        # column with the y extent of the segment inside that column
+        pairs = []
+        for k, (ya, xa, yb, xb) in enumerate(self.edges):
+            ia = self._col(min(xa, xb))
+            ib = self._col(max(xa, xb))
+            for ix in range(ia, ib + 1):
+                cx0 = max(self.x0 + ix * self.dx, min(xa, xb))
+                cx1 = min(self.x0 + (ix + 1) * self.dx, max(xa, xb))
+                if xa == xb:
+                    ys = ya, yb
+                else:
+                    ys = [ya + (yb - ya) * (i - xa) / (xb - xa) for i in (cx0, cx1)]
+                for iy in range(self._row(min(ys)), self._row(max(ys)) + 1):
+                    pairs.append((iy * self.nx + ix, k))
+        return np.unique(np.array(pairs, dtype=np.int64).reshape(-1, 2), axis=0)
+
+    def _row(self, y):
+        return min(max(int((y - self.y0) / self.dy), 0), self.ny - 1)
+
+    def _col(self, x):
+        return min(max(int((x - self.x0) / self.dx), 0), self.nx - 1)
+
+    def in_bounds(self, y, x):
+        return (y >= self.y0) & (y <= self.y1) & (x >= self.x0) & (x <= self.x1)
+
+    def contains(self, y, x):
+        if not self.in_bounds(y, x):
+            return False
+
+        c = self._row(y) * self.nx + self._col(x)
+        st = self.state[c]
+        if st != self.BOUNDARY:
+            return bool(st)
+
+        ids = self.cell_edge_ids[self.cell_start[c]:self.cell_start[c + 1]]
+        edges = self.edges[ids]
+        cross = _segments_cross(y, x, self.center_y[c], self.center_x[c], edges)
+        return bool(self.center_in[c] ^ (cross.sum() % 2))
+
+    def contains_many(self, y, x):
+        """
+        classify arrays of points in one pass, returns a bool array in the
+        broadcast shape of y and x
+        """
+        y, x = np.broadcast_arrays(np.asarray(y, dtype=np.float64),
+                                   np.asarray(x, dtype=np.float64))
+        shape = y.shape
+        y, x = y.reshape(-1), x.reshape(-1)
+        out = np.zeros(y.shape, dtype=bool)
+
+        idx = np.flatnonzero(self.in_bounds(y, x))
+        if not len(idx):
+            return out.reshape(shape)
+        y, x = y[idx], x[idx]
+        iy = np.clip(((y - self.y0) / self.dy).astype(np.int64), 0, self.ny - 1)
+        ix = np.clip(((x - self.x0) / self.dx).astype(np.int64), 0, self.nx - 1)
+        c = iy * self.nx + ix
+        st = self.state[c]
+        out[idx] = st == self.IN
+
+        b = np.flatnonzero(st == self.BOUNDARY)
+        if len(b):
+            cb = c[b]
+            start, cnt = self.cell_start[cb], np.diff(self.cell_start)[cb]
+            # expand to (point, edge) pairs of the boundary cells
+            pt = np.repeat(np.arange(len(b)), cnt)
+            ofs = np.arange(len(pt)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            edges = self.edges[self.cell_edge_ids[np.repeat(start, cnt) + ofs]]
+            cross = _segments_cross(y[b][pt], x[b][pt], self.center_y[cb][pt],
+                                    self.center_x[cb][pt], edges)
+            flips = np.bincount(pt, weights=cross, minlength=len(b)).astype(np.int64)
+            out[idx[b]] = self.center_in[cb] ^ (flips % 2).astype(bool)
+
+        return out.reshape(shape)
@@ -0,0 +1,85 @@
+"""
+array versions of the mercator, epsg:3857 and qmap projections of
+cvt_geosys and maps. every function takes arrays (or scalars), returns
+(y, x) in their broadcast shape and can write into out=(y, x) buffers,
+which may be the matching inputs.
+"""
+import numpy as np
+from .cvt_geosys import (
+    pi2, EARTH_CIRCUM, EPSG3857_K0, EPSG3857_K1, EPSG3857_K2,
+    wgs84_to_gcj02_batch, gcj02_to_wgs84_batch)
+
+MERC_MAX_LAT = 85
+QMAP_K0 = 111319.49077777778
+QMAP_K1 = 0.008726646259971648
+QMAP_K2 = 0.017453292519943295
+
+def _check_lat(lat):
+    assert (np.abs(lat) < MERC_MAX_LAT).all(), \
+        'latitude out of mercator range ({})'.format(MERC_MAX_LAT)
+
+def _prepare(a, b, out):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if out is None:
+        shape = np.broadcast(a, b).shape
+        out = np.empty(shape), np.empty(shape)
+    return a, b, out
+
+def ll2merc(lat, lng, meter=True, out=None):
+    lat, lng, (y, x) = _prepare(lat, lng, out)
+    _check_lat(lat)
+    siny = np.sin(np.radians(lat))
+    # north is positive
+    np.log((1 + siny) / (1 - siny), out=y)
+    y *= 0.5 / pi2
+    np.multiply(np.radians(lng), 1 / pi2, out=x)
+    if meter:
+        y *= EARTH_CIRCUM
+        x *= EARTH_CIRCUM
+    return y, x
+
+def merc2ll(y, x, meter=True, out=None):
+    y, x, (lat, lng) = _prepare(y, x, out)
+    k = pi2 / EARTH_CIRCUM if meter else pi2
+    np.degrees(2 * np.arctan(np.exp(k * y)) - np.pi / 2, out=lat)
+    np.degrees(k * x, out=lng)
+    return lat, lng
+
+def ll2merc_epsg3857(lat, lng, out=None):
+    lat, lng, (y, x) = _prepare(lat, lng, out)
+    _check_lat(lat)
+    np.log(np.tan(np.pi / 4 + np.radians(lat) / 2), out=y)
+    y *= -EPSG3857_K0
+    y += EPSG3857_K1
+    y *= EPSG3857_K2
+    np.multiply(np.radians(lng), EPSG3857_K0, out=x)
+    x += EPSG3857_K1
+    x *= EPSG3857_K2
+    return y, x
+
+def merc2ll_epsg3857(y, x, out=None):
+    y, x, (lat, lng) = _prepare(y, x, out)
+    t = -(y / EPSG3857_K2 - EPSG3857_K1) / EPSG3857_K0
+    np.degrees((x / EPSG3857_K2 - EPSG3857_K1) / EPSG3857_K0, out=lng)
+    np.degrees(2 * np.arctan(np.exp(t)) - np.pi / 2, out=lat)
+    return lat, lng
+
+def qmap_ll2yx(lat, lng, is_gcj02=True, out=None):
+    lat, lng, (y, x) = _prepare(lat, lng, out)
+    if is_gcj02:
+        lat, lng = wgs84_to_gcj02_batch(lat, lng)
+    np.log(np.tan(QMAP_K1 * (90 + lat)), out=y)
+    y *= QMAP_K0 / QMAP_K2
+    np.multiply(lng, QMAP_K0, out=x)
+    return y, x
+
+def qmap_yx2ll(y, x, is_gcj02=True, out=None):
+    y, x, (lat, lng) = _prepare(y, x, out)
+    np.arctan(np.exp(QMAP_K2 / QMAP_K0 * y), out=lat)
+    lat /= QMAP_K1
+    lat -= 90
+    np.divide(x, QMAP_K0, out=lng)
+    if is_gcj02:
+        gcj02_to_wgs84_batch(lat, lng, out=(lat, lng))
+    return lat, lng
@@ -0,0 +1,85 @@
+"""
+multi resolution pano container: a zip with index.json and the jpeg tiles
+of every level at '<zoom>/<row>_<col>.jpg'. edge tiles are cropped to the
+image, so any level or region decodes only the tiles it covers.
+"""
+import os
+import json
+import zipfile
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+PYRAMID_SUFFIX = '.pyr'
+PYRAMID_TILE = 512
+PYRAMID_QUALITY = 90
+
+def _tile_name(zoom, row, col):
+    return '{}/{}_{}.jpg'.format(zoom, row, col)
+
+def write_pyramid(img, f, sizes, tile=PYRAMID_TILE, quality=PYRAMID_QUALITY):
+    """
+    write img, a PIL image, as the levels of sizes {zoom: (w, h)} into f.
+    each level is downsampled from the one above it, only two levels are
+    held at a time.
+    """
+    index = {'tile': tile, 'format': 'jpeg', 'levels': {}}
+    tmp = str(f) + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as zf:
+        for zoom in sorted(sizes, reverse=True):
+            w, h = sizes[zoom]
+            if img.size != (w, h):
+                img = img.resize((w, h), Image.BOX)
+            rows, cols = -(-h // tile), -(-w // tile)
+            index['levels'][str(zoom)] = {'w': w, 'h': h, 'rows': rows, 'cols': cols}
+            for r in range(rows):
+                for c in range(cols):
+                    b = BytesIO()
+                    img.crop((c * tile, r * tile, min((c + 1) * tile, w),
+                              min((r + 1) * tile, h))).save(b, 'JPEG', quality=quality)
+                    zf.writestr(_tile_name(zoom, r, c), b.getvalue())
+        zf.writestr('index.json', json.dumps(index))
+    os.replace(tmp, f)
+
+class PanoPyramid:
+    """
+    reader of write_pyramid containers, levels maps zoom to its w, h, rows
+    and cols
+    """
+    def __init__(self, f):
+        self.zf = zipfile.ZipFile(f)
+        index = json.loads(self.zf.read('index.json'))
+        self.tile_w = index['tile']
+        self.levels = {int(k): v for k, v in index['levels'].items()}
+
+    def tile(self, zoom, row, col):
+        img = Image.open(BytesIO(self.zf.read(_tile_name(zoom, row, col))))
+        return np.asarray(img.convert('RGB'))
+
+    def read(self, zoom, y0=0, x0=0, y1=None, x1=None):
+        """
+        pixels [y0:y1, x0:x1] of a level as an (h, w, 3) uint8 array
+        """
+        lv = self.levels[zoom]
+        y1 = lv['h'] if y1 is None else min(y1, lv['h'])
+        x1 = lv['w'] if x1 is None else min(x1, lv['w'])
+        t = self.tile_w
+        out = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for r in range(y0 // t, -(-y1 // t)):
+            for c in range(x0 // t, -(-x1 // t)):
+                a = self.tile(zoom, r, c)
+                ty, tx = r * t, c * t
+                sy, sx = max(y0, ty), max(x0, tx)
+                ey, ex = min(y1, ty + a.shape[0]), min(x1, tx + a.shape[1])
+                out[sy - y0:ey - y0, sx - x0:ex - x0] = \
+                    a[sy - ty:ey - ty, sx - tx:ex - tx]
+        return out
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,60 +1,460 @@
 import re
+import sys
 import json
-from time import sleep
-from urllib.request import urlopen
+from time import sleep, monotonic
+from threading import Lock, BoundedSemaphore
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit, urljoin
 from urllib.error import HTTPError
 from lxml import etree
 
-_xml_formatter = {
-    '&': '&amp;',
-    '<': '&lt;',
-    '>': '&gt;',
-    "'": '&apos;',
-    '"': '&quot;',
-}
-_xml_re = re.compile('&....')
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# '&' not starting a predefined or a numeric character entity
+_xml_bad_amp = r'&(?!(?:amp|lt|gt|apos|quot|#[0-9]+|#x[0-9a-fA-F]+);)'
+_xml_re = re.compile(_xml_bad_amp)
+_xml_re_b = re.compile(_xml_bad_amp.encode())
+XML_ENTITY_MAX = 32
+
 def fix_xml_error(s):
-    for i in _xml_re.findall(s):
-        if any(i.startswith(j) for j in _xml_formatter.values()):
-            continue
-        s = re.sub(i, '&amp;' + i[1:], s)
-    return s
+    """
+    escape stray '&' in one pass, s is str or bytes like
+    """
+    if isinstance(s, str):
+        return _xml_re.sub('&amp;', s)
+    return _xml_re_b.sub(b'&amp;', s)
+
+def fix_xml_error_iter(chunks):
+    """
+    fix_xml_error over a stream of byte chunks, an unfinished entity at the
+    end of a chunk is carried over to the next one
+    """
+    carry = b''
+    for c in chunks:
+        c = carry + c if carry else c
+        i = c.rfind(b'&')
+        if i >= 0 and len(c) - i < XML_ENTITY_MAX and b';' not in c[i:]:
+            c, carry = c[:i], c[i:]
+        else:
+            carry = b''
+        yield fix_xml_error(c)
+    if carry:
+        yield fix_xml_error(carry)
 
 
 TIMEOUT_BASE = 4  # seconds
+POOL_SIZE = 8  # connections per host
+MAX_REDIRECTS = 5
+USER_AGENT = 'Python-urllib/{}.{}'.format(*sys.version_info[:2])
+MAX_BACKOFF = 300  # seconds
+RETRY_QUEUE_SIZE = 64  # requests waiting to be retried, over all hosts
+RETRY_STATUS = 429, 500, 502, 503, 504
+
+class HostPool:
+    """
+    keep-alive connections to one (scheme, host), at most size of them in
+    use at a time, idle ones are reused
+    """
+    def __init__(self, scheme, host, size=POOL_SIZE, timeout=TIMEOUT_BASE):
+        self.conn_cls = HTTPSConnection if scheme == 'https' else HTTPConnection
+        self.host = host
+        self.timeout = timeout
+        self.sem = BoundedSemaphore(size)
+        self.idle = []
+        self.lock = Lock()
+
+    def _get_conn(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self.conn_cls(self.host, timeout=self.timeout), False
+
+    def _put_conn(self, conn):
+        with self.lock:
+            self.idle.append(conn)
+
+    def request(self, path, headers, timeout=None):
+        timeout = timeout or self.timeout
+        with self.sem:
+            conn, reused = self._get_conn()
+            try:
+                conn.timeout = timeout
+                if conn.sock:
+                    conn.sock.settimeout(timeout)
+                try:
+                    conn.request('GET', path, headers=headers)
+                    resp = conn.getresponse()
+                except (HTTPException, ConnectionError):
+                    if not reused:
+                        raise
+                    # the server dropped an idle keep-alive connection
+                    conn.close()
+                    conn.request('GET', path, headers=headers)
+                    resp = conn.getresponse()
+                body = resp.read()
+            except BaseException:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._put_conn(conn)
+            return resp, body
+
+    def close(self):
+        with self.lock:
+            for i in self.idle:
+                i.close()
+            self.idle = []
+
+class Session:
+    """
+    per host keep-alive connection pools. pool_size and timeout are the
+    defaults, host_pool_sizes and host_timeouts override them by host name.
+    """
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT_BASE,
+                 host_pool_sizes=None, host_timeouts=None, headers=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.host_pool_sizes = host_pool_sizes or {}
+        self.host_timeouts = host_timeouts or {}
+        self.headers = {'User-Agent': USER_AGENT, **(headers or {})}
+        self.pools = {}
+        self.lock = Lock()
+
+    def pool(self, scheme, host):
+        key = scheme, host
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = HostPool(
+                    scheme, host,
+                    size=self.host_pool_sizes.get(host, self.pool_size),
+                    timeout=self.host_timeout(host))
+            return self.pools[key]
+
+    def host_timeout(self, host):
+        return self.host_timeouts.get(host, self.timeout)
+
+    def get(self, url, timeout=None):
+        for _ in range(MAX_REDIRECTS + 1):
+            u = urlsplit(url)
+            path = u.path or '/'
+            if u.query:
+                path += '?' + u.query
+            resp, body = self.pool(u.scheme, u.netloc).request(
+                path, self.headers, timeout=timeout)
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader('location'):
+                url = urljoin(url, resp.getheader('location'))
+                continue
+            if resp.status >= 400:
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            return body
+        raise HTTPError(url, resp.status, 'too many redirects', resp.headers, None)
+
+    def close(self):
+        with self.lock:
+            for i in self.pools.values():
+                i.close()
+
+
+class TokenBucket:
+    """
+    rate tokens per second, up to burst saved up
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.t = monotonic()
+        self.lock = Lock()
+
+    def reserve(self):
+        """
+        take a token, returns the seconds to wait before using it
+        """
+        with self.lock:
+            t = monotonic()
+            self.tokens = min(self.burst, self.tokens + (t - self.t) * self.rate)
+            self.t = t
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0)
+
+class HostState:
+    """
+    rate limit and backoff shared by all requests to one host. each failure
+    doubles the delay and holds back every request to the host until it
+    passes, each success halves it.
+    """
+    def __init__(self, rate=None, burst=1):
+        self.bucket = rate and TokenBucket(rate, burst)
+        self.delay = 0
+        self.until = 0
+        self.lock = Lock()
+
+    def wait_time(self):
+        with self.lock:
+            w = max(self.until - monotonic(), 0)
+        return w, self.bucket.reserve() if self.bucket else 0
+
+    def fail(self):
+        with self.lock:
+            self.delay = min(max(self.delay * 2, TIMEOUT_BASE), MAX_BACKOFF)
+            self.until = max(self.until, monotonic() + self.delay)
+
+    def ok(self):
+        with self.lock:
+            self.delay /= 2
+
+class Metrics:
+    """
+    live request counters, snapshot() adds the rates since start
+    """
+    FIELDS = ('requests', 'ok', 'failed', 'retries', 'dropped', 'in_flight',
+              'bytes', 'backoff_secs', 'throttle_secs')
+
+    def __init__(self):
+        self.start = monotonic()
+        self.lock = Lock()
+        for i in self.FIELDS:
+            setattr(self, i, 0)
+
+    def add(self, **kws):
+        with self.lock:
+            for k, v in kws.items():
+                setattr(self, k, getattr(self, k) + v)
 
-def request_retry(url, retry=8, verbose=False):
-    timeout = TIMEOUT_BASE
-    for i in range(retry):
+    @contextmanager
+    def track(self):
+        self.add(requests=1, in_flight=1)
         try:
-            print('requesting', url)
-            return urlopen(url, timeout=timeout).read()
-        except HTTPError as e:
-            print(url, str(e))
-            return
-        except Exception as e:
-            print('{} {}. retry {}'.format(url, str(e), i + 1))
-            sleep(timeout)
-            timeout *= 2
-    print("request_retry failed on url", url)
-    return
-
-def request_data(url, retry=10, verbose=False):
-    bs = request_retry(url, retry=retry, verbose=verbose)
-    s = bs.decode('utf8', errors='ignore')
-    if 'fn' in url or 'cb' in url:
-        off = s.find('(')
-        if off and s[-2:] == ');':
-            s = s[off + 1:-2]
-
-    if s.startswith('<?xml'):
+            yield
+        finally:
+            self.add(in_flight=-1)
+
+    def snapshot(self):
+        with self.lock:
+            out = {i: getattr(self, i) for i in self.FIELDS}
+        dt = monotonic() - self.start
+        out['ok_per_sec'] = out['ok'] / dt
+        out['bytes_per_sec'] = out['bytes'] / dt
+        return out
+
+class RequestFailed(IOError):
+    """
+    a request given up after its retries or dropped by the scheduler. unlike
+    an error status it says nothing about the resource, so it may be retried.
+    """
+
+class Scheduler:
+    """
+    schedules requests of all workers against the map services: token
+    bucket rate limits and shared backoff per host, and at most
+    retry_queue requests waiting to be retried at a time, further failing
+    requests are dropped. rate and burst are the defaults per host,
+    host_rates overrides the rate by host name. rate None is unlimited.
+    failed requests return None, or raise RequestFailed with raise_failed
+    unless the server answered with an error status. the timeout starts at
+    the one the session has for the host and doubles on each failure.
+    """
+    def __init__(self, rate=None, burst=1, host_rates=None,
+                 retry_queue=RETRY_QUEUE_SIZE):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.retry_slots = BoundedSemaphore(retry_queue)
+        self.hosts = {}
+        self.metrics = Metrics()
+        self.lock = Lock()
+
+    def host(self, host):
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostState(
+                    self.host_rates.get(host, self.rate), self.burst)
+            return self.hosts[host]
+
+    def _wait(self, host):
+        backoff, throttle = host.wait_time()
+        if backoff or throttle:
+            self.metrics.add(backoff_secs=backoff, throttle_secs=throttle)
+            sleep(backoff + throttle)
+
+    def get(self, session, url, retry=8, raise_failed=False):
+        netloc = urlsplit(url).netloc
+        host = self.host(netloc)
+        timeout = session.host_timeout(netloc)
+        queued = False
         try:
-            s = fix_xml_error(s)
-            return etree.fromstring(s.encode())
-        except etree.XMLSyntaxError:
-            print('xml syntax error for', url)
-            return
-    elif s.startswith('{'):
-        return json.loads(s)
+            for i in range(retry):
+                self._wait(host)
+                try:
+                    print('requesting', url, file=sys.stderr)
+                    with self.metrics.track():
+                        body = session.get(url, timeout=timeout)
+                except HTTPError as e:
+                    print(url, str(e), file=sys.stderr)
+                    if e.code not in RETRY_STATUS:
+                        self.metrics.add(failed=1)
+                        return
+                    host.fail()
+                except Exception as e:
+                    print('{} {}. retry {}'.format(url, str(e), i + 1), file=sys.stderr)
+                    host.fail()
+                    timeout *= 2
+                else:
+                    host.ok()
+                    self.metrics.add(ok=1, bytes=len(body))
+                    return body
+
+                if not queued:
+                    if not self.retry_slots.acquire(blocking=False):
+                        print('retry queue full, drop', url, file=sys.stderr)
+                        self.metrics.add(failed=1, dropped=1)
+                        if raise_failed:
+                            raise RequestFailed('dropped ' + url)
+                        return
+                    queued = True
+                self.metrics.add(retries=1)
+        finally:
+            if queued:
+                self.retry_slots.release()
+
+        self.metrics.add(failed=1)
+        print("request_retry failed on url", url, file=sys.stderr)
+        if raise_failed:
+            raise RequestFailed('retries exhausted ' + url)
+
+
+_default_session = None
+_default_scheduler = None
+_default_lock = Lock()
+def default_session():
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = Session()
+        return _default_session
+
+def default_scheduler():
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
+
+def request_retry(url, retry=8, verbose=False, session=None, scheduler=None,
+                  raise_failed=False):
+    session = session or default_session()
+    scheduler = scheduler or default_scheduler()
+    return scheduler.get(session, url, retry=retry, raise_failed=raise_failed)
+
+def map_ordered(fn, items, workers=POOL_SIZE, window=None):
+    """
+    fn over items on a thread pool, results are yielded in input order.
+    at most window items are submitted ahead of the consumer, so memory
+    stays flat for long or endless inputs.
+    """
+    window = window or 4 * workers
+    with ThreadPoolExecutor(workers) as ex:
+        pending = deque()
+        for i in items:
+            pending.append(ex.submit(fn, i))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class StageTimer:
+    """
+    timing hook of request_data, sums the seconds and calls of each stage
+    """
+    def __init__(self):
+        self.secs = {}
+        self.calls = {}
+        self.lock = Lock()
+
+    def __call__(self, stage, secs):
+        with self.lock:
+            self.secs[stage] = self.secs.get(stage, 0) + secs
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {k: (self.calls[k], v) for k, v in self.secs.items()}
+
+
+_ws = b' \t\r\n'
+
+def _strip_jsonp(url, bs):
+    # cb(...); wrapper, sliced off by offset without copying
+    b = memoryview(bs)
+    if 'fn' not in url and 'cb' not in url:
+        return b
+    end = len(bs)
+    while end and bs[end - 1] in _ws:
+        end -= 1
+    off = bs.find(b'(')
+    if off > 0 and bs[end - 2:end] == b');':
+        return b[off + 1:end - 2]
+    return b
+
+def _parse_json(b):
+    if orjson:
+        return orjson.loads(b)
+    try:
+        return json.loads(bytes(b))
+    except UnicodeDecodeError:
+        return json.loads(bytes(b).decode('utf8', errors='ignore'))
+
+def _parse_xml(b):
+    if _xml_re_b.search(b):
+        b = fix_xml_error(b)
+    return etree.fromstring(b)
+
+def request_data(url, retry=10, verbose=False, session=None, scheduler=None,
+                 timing=None, raise_failed=False):
+    """
+    fetch url and parse the xml or json in it, straight from the response
+    bytes. timing(stage, seconds) is called for the fetch, strip and parse
+    stages. raise_failed is passed on to Scheduler.get.
+    """
+    t = monotonic()
+    bs = request_retry(url, retry=retry, verbose=verbose, session=session,
+                       scheduler=scheduler, raise_failed=raise_failed)
+    if timing:
+        t, t0 = monotonic(), t
+        timing('fetch', t - t0)
+    if not bs:
+        return
+
+    b = _strip_jsonp(url, bs)
+    # sniff the format from the first non blank byte
+    i = 0
+    while i < len(b) and b[i] in _ws:
+        i += 1
+    b = b[i:]
+    if timing:
+        t, t0 = monotonic(), t
+        timing('strip', t - t0)
+
+    try:
+        if b[:1] == b'<':
+            try:
+                return _parse_xml(b)
+            except etree.XMLSyntaxError:
+                print('xml syntax error for', url, file=sys.stderr)
+                return
+        elif b[:1] == b'{':
+            return _parse_json(b)
+    finally:
+        if timing:
+            timing('parse', monotonic() - t)
 
     raise
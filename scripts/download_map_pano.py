@@ -3,15 +3,21 @@ from pathlib import Path
 import math as M
 from io import BytesIO
 from functools import partial
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryFile
+import numpy as np
 from PIL import Image
-import yaml
 from geosys.maps import (
     QMAP_PANO_IMG_URL,
     BMAP_PANO_IMG_URL,
     GMAP_PANO_IMG_URL,
     AMAP_PANO_IMG_URL
 )
-from geosys.utils import request_retry
+from geosys.utils import request_retry, Session, Scheduler
+from geosys.panos import iter_pano_ids
+from geosys.cache import TileCache
+from geosys.pyramid import write_pyramid, PYRAMID_SUFFIX
 import click
 
 map_types = 'gmap', 'bmap', 'amap', 'qmap'
@@ -72,21 +78,138 @@ MapPanoDownloaders = {
 def align(x, dx):
     return M.ceil(x / dx) * dx
 
+def get_pano_size(w, zoom):
+    # the pano width at zoom, halved from the full width of the map
+    while w > TILE_W * 2**zoom:
+        w /= 2
+    return int(w), int(w / 2)
+
 def get_tile_grid(w, h):
     return [(ti, pi) for ti in range(int(h / TILE_W))
             for pi in range(int(w / TILE_W))]
 
 
+class TileFetcher:
+    """
+    fetch tiles on a thread pool over keep-alive connections, with at most
+    per_host requests in flight and at most rate requests per second
+    against each mirror host
+    """
+    def __init__(self, workers, per_host, rate=None, tiles=None):
+        self.pool = ThreadPoolExecutor(workers)
+        self.session = Session(pool_size=per_host)
+        self.scheduler = Scheduler(rate=rate, burst=per_host)
+        self.tiles = tiles
+
+    def fetch(self, url):
+        return request_retry(url, session=self.session, scheduler=self.scheduler)
+
+    def load(self, key, url, fn):
+        content = self.tiles.get(key) if self.tiles else None
+        if content is None:
+            content = self.fetch(url)
+            if content is not None and self.tiles:
+                self.tiles.put(key, content)
+        try:
+            fn(content)
+        except OSError:
+            # a bad tile is fetched again on retry
+            if self.tiles:
+                self.tiles.discard(key)
+            raise
+
+    def submit(self, key, url, fn):
+        # fn consumes the tile bytes on the worker, so compressed tiles
+        # live only while their worker is busy. tiles found in the tile
+        # cache are not fetched again.
+        return self.pool.submit(self.load, key, url, fn)
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.session.close()
+
+class PanoCanvas:
+    """
+    preallocated (h, w, 3) pixel buffer of one pano, optionally memory
+    mapped in mmap_dir. tiles are decoded straight into their slots and
+    clipped at the borders, so no crop is needed.
+    """
+    def __init__(self, w, h, mmap_dir=None, levels=None):
+        # levels {zoom: (w, h)} saves a pyramid instead of one jpeg
+        self.levels = levels
+        shape = h, w, 3
+        if mmap_dir:
+            self.buf = np.memmap(TemporaryFile(dir=mmap_dir), dtype=np.uint8,
+                                 mode='w+', shape=shape)
+        else:
+            self.buf = np.empty(shape, dtype=np.uint8)
+
+    def paste_tile(self, ti, pi, content):
+        if content is None:
+            raise OSError('no tile content')
+        img = Image.open(BytesIO(content))
+        if img.size[0] != TILE_W:
+            raise OSError('img_w({}) != {}'.format(img.size[0], TILE_W))
+        y, x = ti * TILE_W, pi * TILE_W
+        dst = self.buf[y:y + TILE_W, x:x + TILE_W]
+        dst[...] = np.asarray(img.convert('RGB'))[:dst.shape[0], :dst.shape[1]]
+
+    def save(self, out_f):
+        if self.levels is not None:
+            write_pyramid(Image.fromarray(self.buf), out_f, self.levels)
+        else:
+            Image.fromarray(self.buf).save(out_f)
+
+def finish_pano(pid, keys, futures, canvas, out_f, failed, tiles=None):
+    errs = []
+    for fut in futures:
+        try:
+            fut.result()
+        except OSError as e:
+            errs.append(e)
+
+    if errs:
+        print(f'OSError {errs[0]}, {len(errs)} tiles of {pid} failed, retry later')
+        failed.append(pid)
+        return canvas
+
+    canvas.save(out_f)
+    if tiles:
+        for k in keys:
+            tiles.discard(k)
+    return canvas
+
+
 click.option = partial(click.option, show_default=True)
 @click.command()
 @click.argument("src")
 @click.option('-o', '--out', default='')
 @click.option('-t', '--map_type', type=click.Choice(map_types), default='qmap')
 @click.option('-z', '--zoom', default=3, help='needed zoom')
-def main(src, out, map_type, zoom):
+@click.option('-j', '--workers', default=16, help='concurrent tile requests')
+@click.option('--per_host', default=4, help='concurrent requests per host')
+@click.option('--panos', default=4, help='panos in flight')
+@click.option('--mmap_dir', default='', help='memory map pano buffers here')
+@click.option('--rate', default=0.0,
+              help='requests per second per host, 0 for no limit')
+@click.option('--tile_cache', default='',
+              help='fetched tiles are kept here until their pano is saved, '
+              'defaults to <out>/.tiles')
+@click.option('--keep_tiles', is_flag=True, help='keep tiles of saved panos')
+@click.option('--retries', default=2, help='passes over panos with failed tiles')
+@click.option('--pyramid', is_flag=True,
+              help='save zooms min_zoom to zoom as one tiled .pyr container')
+@click.option('--min_zoom', default=0, help='lowest zoom of a pyramid')
+def main(src, out, map_type, zoom, workers, per_host, panos, mmap_dir, rate,
+         tile_cache, keep_tiles, retries, pyramid, min_zoom):
+    if pyramid and not 0 <= min_zoom <= zoom:
+        raise click.BadParameter(
+            'must be in 0..{} (the zoom)'.format(zoom), param_hint='--min_zoom')
+
     src = Path(src)
     if src.exists():
-        pids = list(yaml.load(open(src)).keys())
+        # streamed from the id column of a pano directory
+        pids = iter_pano_ids(src)
         if not out:
             out = src.parent / src.stem
             out.mkdir(exist_ok=True)
@@ -94,62 +217,65 @@ def main(src, out, map_type, zoom):
         pids = [src]
         if not out:
             out = src.parent
+    out = Path(out)
 
     mpd = MapPanoDownloaders[map_type](zoom)
 
-    real_w = mpd.w
-    while real_w > TILE_W * 2**zoom:
-        real_w /= 2
-    real_w = int(real_w)
-    real_h = int(real_w / 2)
+    real_w, real_h = get_pano_size(mpd.w, zoom)
     w, h = align(real_w, TILE_W), align(real_h, TILE_W)
-    need_crop = real_w < w or real_h < h
     tile_grid = get_tile_grid(w, h)
 
-    canvas = Image.new('RGB', (int(w), int(h)))
+    # tiles are only fetched at zoom, lower levels are downsampled from it
+    levels = None
+    suffix = '.jpg'
+    if pyramid:
+        levels = {z: get_pano_size(mpd.w, z) for z in range(min_zoom, zoom + 1)}
+        suffix = PYRAMID_SUFFIX
 
-    for pid in pids:
-        out_f = (out / pid).with_suffix('.jpg')
-        print(f"proessing {out_f}")
-        if out_f.exists():
-            print(f"{out_f} exists")
-            continue
-
-        keys, urls = [], []
-        for ti, pi in tile_grid:
-            keys.append((ti, pi))
-            urls.append(mpd.get_url(pid, ti, pi))
-
-        content0 = request_retry(urls[0])
-        try:
-            b = BytesIO(content0)
-            img = Image.open(b)
-            img_w, img_h = img.size
-            if img_w != TILE_W:
-                print('img_w({}) !='.format(img_w), TILE_W)
-                exit()
-
-        except OSError:
-            print('OSError, set white')
-            exit()
+    # one buffer per pano in flight, reused across panos
+    free = [PanoCanvas(real_w, real_h, mmap_dir=mmap_dir, levels=levels)
+            for _ in range(panos)]
+    tiles = TileCache(tile_cache or Path(out) / '.tiles')
+    fetcher = TileFetcher(workers, per_host, rate=rate or None, tiles=tiles)
+    # tiles of saved panos are dropped from the cache
+    done_tiles = None if keep_tiles else tiles
 
-        contents = [request_retry(i) for i in urls[1:]]
-        contents = [content0] + contents
-        for (ti, pi), content in zip(keys, contents):
-            try:
-                b = BytesIO(content)
-                img = Image.open(b)
+    def run(pids):
+        failed = []
+        pending = deque()
+        for pid in pids:
+            out_f = (out / pid).with_suffix(suffix)
+            print(f"proessing {out_f}")
+            if out_f.exists():
+                print(f"{out_f} exists")
+                continue
 
-            except OSError:
-                print('OSError, set white')
-                exit()
+            if not free:
+                free.append(finish_pano(*pending.popleft(), failed, done_tiles))
+            canvas = free.pop()
+            keys = [(map_type, str(pid), zoom, ti, pi) for ti, pi in tile_grid]
+            futures = [fetcher.submit(k, mpd.get_url(pid, ti, pi),
+                                      partial(canvas.paste_tile, ti, pi))
+                       for k, (ti, pi) in zip(keys, tile_grid)]
+            pending.append((pid, keys, futures, canvas, out_f))
 
-            canvas.paste(img, (pi * TILE_W, ti * TILE_W))
+        while pending:
+            free.append(finish_pano(*pending.popleft(), failed, done_tiles))
+        return failed
 
-        if need_crop:
-            canvas = canvas.crop((0, 0, real_w, real_h))
+    try:
+        failed = run(pids)
+        for i in range(retries):
+            if not failed:
+                break
+            print(f'retry {len(failed)} panos, pass {i + 1}')
+            failed = run(failed)
+        if failed:
+            print('failed panos', *failed)
 
-        canvas.save(out_f)
+    finally:
+        fetcher.shutdown()
+        print('requests', fetcher.scheduler.metrics.snapshot())
 
 
 if __name__ == "__main__":
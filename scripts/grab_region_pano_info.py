@@ -1,10 +1,14 @@
 #!/usr/bin/env python
+import time
 from pathlib import Path
 import math as M
+from collections import deque
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 import numpy.linalg as npl
 import yaml
-from shapely.geometry import Polygon, Point
+from shapely.geometry import Polygon
 from pprint import pformat
 import click
 
@@ -12,16 +16,20 @@ from geosys.maps import (
     QMAP_PANO_BY_ID_URL,
     QMAP_PANO_BY_YX_URL,
     qmap_parse_pano_info,
+    qmap_pano_record,
     qmap_ll2yx,
     AMAP_PANO_BY_ID_URL,
     AMAP_PANO_BY_YX_URL,
 )
 
-from geosys.utils import request_data
+from geosys.utils import request_data, Session, Scheduler, StageTimer, RequestFailed
 from geosys.cvt_geosys import (
     geo_dist, in_china, is_latlng, gcj02_to_wgs84,
     wgs84_to_gcj02, unit_ll_meter)
-from geosys.io_ import load_txt, save_txt
+from geosys.cache import open_store, DirStore, LRUCache, NegativeCache, NEG_TTL
+from geosys.io_ import dumps_txt, save_pickle, load_pickle
+from geosys.poly_index import PolygonIndex
+from geosys.panos import PanoRecord, PANO_DIR_SUFFIX, dump_panos
 
 def PR2ptr(R):
     return (M.atan2(R[2, 0], R[2, 2]),
@@ -53,14 +61,30 @@ def axisangle2PR(v, t):
     return axisangle2R(v, -t)
 
 
+PANO_LRU_ENTRIES = 10000
+CHECKPOINT_SECS = 60
+
 class MapPanoGrabber:
-    def __init__(self, cache, server_nr, by_id, by_yx, pano_data_fmt='.json'):
+    map_type = None
+
+    def __init__(self, cache, server_nr, by_id, by_yx, pano_data_fmt='.json',
+                 lru=None, neg_ttl=NEG_TTL, rate=None):
         self.cache = cache
-        self.failed_panos_f = cache / 'failed_panos.yaml'
-        if self.failed_panos_f.exists():
-            self.failed_panos = set(yaml.save_load(open(self.failed_panos_f)))
+        # parsed panos by (map_type, id), in front of the store
+        self.lru = LRUCache(PANO_LRU_ENTRIES) if lru is None else lru
+        # a cache directory, or a single file store when cache is a .db
+        self.store = open_store(cache, pano_data_fmt)
+        if isinstance(self.store, DirStore):
+            self.failed_panos_f = cache / 'failed_panos.log'
         else:
-            self.failed_panos = set()
+            self.failed_panos_f = cache.with_name(cache.stem + '_failed_panos.log')
+        # failed ids and empty latlng queries, kept across runs until ttl
+        legacy_f = self.failed_panos_f.with_suffix('.yaml')
+        is_new = not self.failed_panos_f.exists()
+        self.failed_panos = NegativeCache(self.failed_panos_f, ttl=neg_ttl)
+        if is_new and legacy_f.exists():
+            for i in yaml.safe_load(open(legacy_f)) or []:
+                self.failed_panos.add(i)
 
         self.server_nr = server_nr
         self.by_id = by_id
@@ -70,6 +94,11 @@ class MapPanoGrabber:
         self.total = 0
         self.server_nr = server_nr
         self.cur_server = 0
+        self.session = Session()
+        # rate limit and backoff shared by all workers
+        self.scheduler = Scheduler(rate=rate)
+        self.timing = StageTimer()
+        self.lock = Lock()
 
     def pano_id(self, p):
         raise
@@ -91,42 +120,61 @@ class MapPanoGrabber:
             return self.by_yx.format(y=y, x=x)
         return self.by_yx.format(server=self.inc_server(), y=y, x=x)
 
-    def cache_info_f(self, name):
-        return (self.cache / name).with_suffix(self.pano_data_fmt)
-
     def add_failed_pano(self, n):
         print("add failed_pano", len(self.failed_panos), n)
         self.failed_panos.add(n)
 
     def request_pano_data(self, q):
-        self.total += 1
-        print('current request', self.total)
-        if isinstance(q, str):
-            if q in self.failed_panos:
-                return
-
-            info_f = self.cache_info_f(q)
-            if info_f.exists():
-                return load_txt(info_f)
+        """
+        q is a pano id or a wgs84 (lat, lng), which get_by_yx_url turns into
+        the map's own coordinates. so dead lat/lng queries are keyed by
+        degrees rounded to NEG_LL_DIGITS, about a meter.
+
+        only definite negatives, an error status or a response without a
+        pano, go to failed_panos. requests that failed in transport raise
+        RequestFailed and are not recorded.
+        """
+        with self.lock:
+            self.total += 1
+            print('current request', self.total)
+        if q in self.failed_panos:
+            return
 
-            pano = request_data(self.get_by_id_url(q), verbose=True)
-            if not pano:
+        if isinstance(q, str):
+            key = self.map_type, q
+            pano = self.lru.get(key)
+            if pano is not None:
+                return pano
+
+            pano = self.store.get(q)
+            if pano is not None:
+                self.lru.put(key, pano)
+                return pano
+
+            pano = request_data(self.get_by_id_url(q), verbose=True,
+                                session=self.session, scheduler=self.scheduler,
+                                timing=self.timing, raise_failed=True)
+            if pano is None:
                 print('pano is None')
                 self.add_failed_pano(q)
                 return
 
-            if not info_f.exists():
-                save_txt(pano, info_f)
+            self.store.put(q, pano)
+            self.lru.put(key, pano)
 
         elif is_latlng(q):
-            pano = request_data(self.get_by_yx_url(q))
-            if not pano:
+            pano = request_data(self.get_by_yx_url(q), session=self.session,
+                                scheduler=self.scheduler, timing=self.timing,
+                                raise_failed=True)
+            if pano is None:
                 print('pano is None')
+                self.add_failed_pano(q)
                 return
 
             i = self.pano_id(pano)
             if not i:
                 print('no pano_id\n', pformat(pano))
+                self.add_failed_pano(q)
                 return
 
         else:
@@ -135,66 +183,134 @@ class MapPanoGrabber:
         return pano
 
     def cache_infos(self, ids):
-        for i in ids:
-            self.request_pano_data(i)
-
-    def grab_region(self, seeds, bnd):
-        done = {}
-        queue = set()
-        for i in seeds:
-            pano = self.get_pano_by_latlng(i)
-            if pano:
-                queue.add(self.pano_id(pano))
-
-        cur_nr = 0
-        visited = set()
-        while queue:
-            print('queue len', len(queue))
-            queue2 = set()
-            for i in queue:
-                if i in visited:
-                    continue
-                visited.add(i)
-                queue2.add(i)
-
-            if not queue2:
-                break
-
-            rets = [self.get_pano(i, bnd=bnd) for i in queue2]
-            queue = set()
-            for ret in rets:
-                if not ret:
-                    continue
-
-                # for multi floor case in gmap, pano may not exist
-                # when in incorrect floor
-                p = ret.get('pano', None)
-                if p:
-                    pid, (lat, lng) = p['id'], p['latlng']
-                    # when i is latlng, pid is missed, we need to add it again
-                    if pid not in visited:
-                        visited.add(pid)
-
-                    if not bnd.contains(Point(lat, lng)):
+        ids = set(ids)
+        for i in ids - self.store.contains_many(ids):
+            try:
+                self.request_pano_data(i)
+            except RequestFailed as e:
+                print(e)
+
+    def grab_region(self, seeds, bnd, workers=1, checkpoint=None,
+                    checkpoint_secs=CHECKPOINT_SECS):
+        """
+        crawl pano links from seeds inside bnd, keeping up to workers
+        get_pano calls in flight. links of each response join the frontier
+        as soon as it arrives.
+
+        with a checkpoint file the crawl state is saved there every
+        checkpoint_secs and when done, and a crawl of the same seeds
+        resumes from it. panos whose requests failed in transport stay in
+        the queue of the checkpoint, so the next run retries them.
+        """
+        state = None
+        if checkpoint and Path(checkpoint).exists():
+            state = load_pickle(checkpoint)
+            if state['seeds'] != seeds:
+                print('ignore checkpoint of other seeds', checkpoint)
+                state = None
+
+        with ThreadPoolExecutor(workers) as ex:
+            if state:
+                queue, visited = deque(state['queue']), state['visited']
+                done, cur_nr = state['done'], state['cur_nr']
+                # older checkpoints kept the info dicts of get_pano
+                done = {k: v if isinstance(v, PanoRecord) else PanoRecord.from_info(v)
+                        for k, v in done.items()}
+                self.total = state['total']
+                print('resume', checkpoint, 'done', len(done), 'queue', len(queue))
+            else:
+                queue = deque(self.pano_id(i) for i in
+                              ex.map(self._seed_pano, seeds) if i)
+                done = {}
+                cur_nr = 0
+                visited = set()
+
+            in_flight = {}
+            failed = []
+
+            def save_checkpoint():
+                # requests in flight are redone on resume
+                pending = set(in_flight.values())
+                save_pickle({
+                    'seeds': seeds,
+                    'queue': list(pending) + list(queue) + failed,
+                    'visited': visited - pending,
+                    'done': done,
+                    'cur_nr': cur_nr,
+                    'total': self.total,
+                }, checkpoint)
+
+            saved = time.monotonic()
+            while queue or in_flight:
+                while queue and len(in_flight) < workers:
+                    i = queue.popleft()
+                    if i in visited:
                         continue
+                    visited.add(i)
+                    in_flight[ex.submit(self.get_pano, i, bnd=bnd)] = i
 
-                    lat, lng = round(lat, 6), round(lng, 6)
-                    done[pid] = p
-                    cur_nr += 1
-                    print('add', cur_nr, pid, done[pid])
+                if not in_flight:
+                    break
+
+                rets, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                print('queue len', len(queue), 'in flight', len(in_flight))
+                for fut in rets:
+                    i = in_flight.pop(fut)
+                    try:
+                        ret = fut.result()
+                    except RequestFailed as e:
+                        print(e)
+                        visited.discard(i)
+                        failed.append(i)
+                        continue
+                    if not ret:
+                        continue
+
+                    # for multi floor case in gmap, pano may not exist
+                    # when in incorrect floor
+                    p = ret.get('pano', None)
+                    if p:
+                        pid, (lat, lng) = p['id'], p['latlng']
+                        # when i is latlng, pid is missed, we need to add it again
+                        if pid not in visited:
+                            visited.add(pid)
 
-                links = ret['links']
-                queue |= set(i for i in links if i not in done)
+                        if not bnd.contains(lat, lng):
+                            continue
 
-        if self.failed_panos:
-            yaml.dump(list(self.failed_panos), open(self.failed_panos_f, 'w'))
+                        done[pid] = PanoRecord.from_info(p)
+                        cur_nr += 1
+                        print('add', cur_nr, pid, done[pid])
+
+                    queue.extend(i for i in ret['links']
+                                 if i not in done and i not in visited)
+
+                if checkpoint and time.monotonic() - saved > checkpoint_secs:
+                    save_checkpoint()
+                    saved = time.monotonic()
+                    print('requests', self.scheduler.metrics.snapshot())
+
+            if checkpoint:
+                save_checkpoint()
+            if failed:
+                print('requests failed for', len(failed), 'panos')
 
         return done
 
+    def _seed_pano(self, latlng):
+        try:
+            return self.get_pano_by_latlng(latlng)
+        except RequestFailed as e:
+            print(e)
+
     def grab_panos(self, a):
         panos = {}
         for i in a:
-            p = self.get_pano(i)
+            try:
+                p = self.get_pano(i)
+            except RequestFailed as e:
+                print(e)
+                continue
             if not p or not p.get('pano', None):
                 continue
 
@@ -205,11 +321,13 @@ class MapPanoGrabber:
 
 # havent add date
 class GMapPanoGrabber(MapPanoGrabber):
-    def __init__(self, cache, floor=0):
+    map_type = 'gmap'
+
+    def __init__(self, cache, floor=0, **kws):
         server_url = "https://cbks{server}.googleapis.com/cbk?"
         by_id_url = server_url + "output=json&panoid={id}"
         by_yx_url = server_url + "output=json&ll={y},{x}&radius=50"
-        super().__init__(cache, 4, by_id_url, by_yx_url)
+        super().__init__(cache, 4, by_id_url, by_yx_url, **kws)
         self.floor = floor
 
     def pano_id(self, pano):
@@ -276,8 +394,10 @@ class GMapPanoGrabber(MapPanoGrabber):
 AMAP_K = 0.00274658203125
 
 class AMapPanoGrabber(MapPanoGrabber):
-    def __init__(self, cache, floor=0):
-        super().__init__(cache, 1, AMAP_PANO_BY_ID_URL, AMAP_PANO_BY_YX_URL)
+    map_type = 'amap'
+
+    def __init__(self, cache, floor=0, **kws):
+        super().__init__(cache, 1, AMAP_PANO_BY_ID_URL, AMAP_PANO_BY_YX_URL, **kws)
 
     @staticmethod
     def rename_id(i):
@@ -290,10 +410,13 @@ class AMapPanoGrabber(MapPanoGrabber):
         q1 = q.replace('_', '/')
         return super().get_by_id_url(q1)
 
-    def get_pano_by_latlng(self, latlng):
+    def get_by_yx_url(self, latlng):
         lat, lng = wgs84_to_gcj02(*latlng)
-        q = lat / AMAP_K, lng / AMAP_K
-        pano = self.request_pano_data(q)
+        return super().get_by_yx_url((lat / AMAP_K, lng / AMAP_K))
+
+    def get_pano_by_latlng(self, latlng):
+        lat, lng = latlng
+        pano = self.request_pano_data((float(lat), float(lng)))
         if pano is None or ('result' in pano and pano['result'] == 'nodata'):
             return
         return pano
@@ -311,23 +434,41 @@ class AMapPanoGrabber(MapPanoGrabber):
         }
 
 class QMapPanoGrabber(MapPanoGrabber):
-    def __init__(self, cache, floor=0):
+    map_type = 'qmap'
+
+    def __init__(self, cache, floor=0, **kws):
         super().__init__(cache, 1, QMAP_PANO_BY_ID_URL, QMAP_PANO_BY_YX_URL,
-                         pano_data_fmt='.xml')
+                         pano_data_fmt='.xml', **kws)
 
     def pano_id(self, p):
-        return p['detail']['svid']
+        return p['detail'].get('svid')
+
+    def get_by_yx_url(self, latlng):
+        return super().get_by_yx_url(qmap_ll2yx(*latlng))
 
     def get_pano_by_latlng(self, latlng):
-        y, x = qmap_ll2yx(*latlng)
-        pano = self.request_pano_data((y, x))
-        if 'svid' not in pano['detail']:
+        lat, lng = latlng
+        pano = self.request_pano_data((float(lat), float(lng)))
+        if pano is None or 'svid' not in pano['detail']:
             return
         return pano
 
+    def get_record(self, q):
+        """
+        qmap_pano_record of pano id q, kept in the store next to the
+        payload so store hits are not parsed again
+        """
+        r = self.store.get_record(q)
+        if r is None:
+            r = qmap_pano_record(self.request_pano_data(q))
+            if r is not None:
+                self.store.put_record(q, r)
+        return r
+
     def get_pano(self, q, bnd=None):
-        pano = self.request_pano_data(q)
-        return qmap_parse_pano_info(pano, bnd=bnd)
+        if isinstance(q, str):
+            return qmap_parse_pano_info(self.get_record(q), bnd=bnd)
+        return qmap_parse_pano_info(self.request_pano_data(q), bnd=bnd)
 
 def gen_loc_grid1(x0, x1, nr):
     if nr <= 1:
@@ -336,6 +477,27 @@ def gen_loc_grid1(x0, x1, nr):
         return (x0 + x1) / 2, x0, x1
     return np.linspace(x0, x1, num=nr, endpoint=True)
 
+
+REGION_GRID = 64
+
+class Region(PolygonIndex):
+    """
+    (lat, lng) polygon of a crawl with a grid index for point queries,
+    contains(lat, lng) and contains_many(lats, lngs)
+    """
+    def __init__(self, poly, grid=REGION_GRID):
+        self.poly = poly
+        super().__init__([poly.exterior.coords]
+                         + [i.coords for i in poly.interiors], grid=grid)
+
+    @property
+    def bounds(self):
+        return self.poly.bounds
+
+    @property
+    def centroid(self):
+        return self.poly.centroid
+
 def make_region(r):
     tp = r['type']
     if tp == 'square':
@@ -351,7 +513,7 @@ def make_region(r):
         x0 = cx - rx
         x1 = cx + rx
 
-        return Polygon([(y0, x0), (y0, x1), (y1, x1), (y1, x0)])
+        return Region(Polygon([(y0, x0), (y0, x1), (y1, x1), (y1, x0)]))
     else:
         raise
 
@@ -369,8 +531,10 @@ def gen_seed_grid(region, margin, gap=0):
     nr = M.ceil(geo_dist(lat0, lng0, lat0, lng1) / margin)
     lngs = gen_loc_grid1(lng0, lng1, nr)
 
-    return [(lat, lng) for lat in lats for lng in lngs
-            if region.contains(Point(lat, lng))]
+    lats, lngs = np.meshgrid(lats, lngs, indexing='ij')
+    lats, lngs = lats.ravel(), lngs.ravel()
+    keep = region.contains_many(lats, lngs)
+    return list(zip(lats[keep].tolist(), lngs[keep].tolist()))
 
 
 #    'bmap': BMapPanoGrabber,
@@ -382,25 +546,45 @@ MapPanoGrabbers = {
 
 @click.command()
 @click.argument('regions')
-@click.option('-o', '--out', default='')
+@click.option('-o', '--out', default='',
+              help='pano column directory (.panos), or a .yaml file')
 @click.option('-t', '--map_type', type=click.Choice(MapPanoGrabbers.keys()),
               default='qmap')
 @click.option('--floor', default=0, help='for multi floors in gmap')
-@click.option('--cache_dir', default='info_cache')
-def main(regions, out, map_type, floor, cache_dir):
+@click.option('--cache_dir', default='info_cache',
+              help='cache directory, or a single file store if ending in .db')
+@click.option('--import_cache', default='', help='cache directory to load into a .db')
+@click.option('-j', '--workers', default=8, help='concurrent pano requests')
+@click.option('--lru_entries', default=PANO_LRU_ENTRIES,
+              help='parsed panos kept in memory')
+@click.option('--lru_mb', default=0.0, help='memory budget of parsed panos, 0 for none')
+@click.option('--neg_ttl', default=NEG_TTL / 86400,
+              help='days before failed queries are retried')
+@click.option('--checkpoint_secs', default=CHECKPOINT_SECS,
+              help='seconds between crawl checkpoints, 0 to disable')
+@click.option('--rate', default=0.0,
+              help='requests per second per host, 0 for no limit')
+def main(regions, out, map_type, floor, cache_dir, import_cache, workers,
+         lru_entries, lru_mb, neg_ttl, checkpoint_secs, rate):
     regions = Path(regions)
     if not out:
-        out = (regions.parent / str(regions.stem + '_panos')).with_suffix('.yaml')
+        out = regions.parent / (regions.stem + '_panos' + PANO_DIR_SUFFIX)
+    out = Path(out)
 
     cache_dir = Path(cache_dir)
-    cache_dir.mkdir(exist_ok=True)
-    mpg = MapPanoGrabbers[map_type](cache_dir, floor=floor)
+    # sized by the serialized pano, only evaluated when lru_mb is set
+    lru = LRUCache(lru_entries or None, max_bytes=lru_mb * 2**20 or None,
+                   sizeof=lambda a: len(dumps_txt(a, mpg.pano_data_fmt)))
+    mpg = MapPanoGrabbers[map_type](cache_dir, floor=floor, lru=lru,
+                                    neg_ttl=neg_ttl * 86400, rate=rate or None)
+    if import_cache:
+        print('imported', mpg.store.import_dir(import_cache), 'panos')
 
     pi = yaml.full_load(open(regions))
     seed_gap = pi['seed_gap']
     regions = pi['regions']
 
-    for r in regions:
+    for k, r in enumerate(regions):
         region = make_region(r)
         c = region.centroid
 
@@ -409,12 +593,17 @@ def main(regions, out, map_type, floor, cache_dir):
                or (not is_in_china and map_type == 'gmap'))
 
         seeds = gen_seed_grid(region, seed_gap)
-        panos = mpg.grab_region(seeds, region)
+        # rerunning the same command resumes from the last checkpoint
+        ckpt = out.with_suffix(f'.{k}.ckpt') if checkpoint_secs else None
+        panos = mpg.grab_region(seeds, region, workers=workers, checkpoint=ckpt,
+                                checkpoint_secs=checkpoint_secs)
 
         print(f"generated {len(panos)} panos to {out}")
-        with open(out, 'w') as fp:
-            print(f"# size {len(panos)}", file=fp)
-            yaml.dump(panos, fp)
+        dump_panos(list(panos.values()), out)
+
+    print('pano lru', mpg.lru.stats())
+    print('requests', mpg.scheduler.metrics.snapshot())
+    print('request stages', mpg.timing.stats())
 
 
 if __name__ == "__main__":
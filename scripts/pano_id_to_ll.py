@@ -1,25 +1,54 @@
 #!/usr/bin/env python
-from geosys.maps import MAP_TYPES, QMAP_PANO_BY_ID_URL, qmap_parse_pano_info
-from geosys.utils import request_data
+import sys
+from pathlib import Path
+from itertools import chain
+from geosys.maps import (
+    MAP_TYPES, QMAP_PANO_BY_ID_URL, qmap_parse_pano_info, qmap_pano_record)
+from geosys.utils import request_data, Session, map_ordered
+from geosys.cache import open_store
+from geosys.io_ import iter_lines
 import click
 
 @click.command()
-@click.argument("pid")
+@click.argument("pids", nargs=-1)
+@click.option('-i', '--input', 'inp', type=click.File('r'),
+              help="file of pano ids, one per line, '-' for stdin")
 @click.option('-t', '--map_type', type=click.Choice(MAP_TYPES), default='qmap')
 @click.option('-v', '--verbose', count=True)
-def main(pid, map_type, verbose):
-    if map_type == 'qmap':
-        pano = request_data(QMAP_PANO_BY_ID_URL.format(id=pid))
-        pano = qmap_parse_pano_info(pano)
+@click.option('--cache_dir', default='',
+              help='pano metadata cache to look up first, a directory or a .db')
+@click.option('-j', '--workers', default=8, help='concurrent lookups')
+def main(pids, inp, map_type, verbose, cache_dir, workers):
+    if map_type != 'qmap':
+        raise
 
-        if verbose:
-            print(pano)
+    store = open_store(Path(cache_dir), '.xml') if cache_dir else None
+    session = Session(pool_size=workers)
 
-        p = pano['pano']
-        print(p['id'], *p['latlng'])
+    def resolve(pid):
+        r = store.get_record(pid) if store else None
+        if r is None:
+            pano = store.get(pid) if store else None
+            if pano is None:
+                pano = request_data(QMAP_PANO_BY_ID_URL.format(id=pid),
+                                    session=session)
+                if pano is not None and store:
+                    store.put(pid, pano)
+            r = qmap_pano_record(pano)
+            if r is not None and store:
+                store.put_record(pid, r)
+        if verbose:
+            print(qmap_parse_pano_info(r), file=sys.stderr)
+        return pid, r
 
-    else:
-        raise
+    # one line per id in input order, as soon as it is resolved
+    if inp:
+        pids = chain(pids, iter_lines(inp))
+    for pid, r in map_ordered(resolve, pids, workers=workers):
+        if r is None:
+            print(pid, None, None, flush=True)
+        else:
+            print(r['id'], r['lat'], r['lng'], flush=True)
 
 
 if __name__ == "__main__":
@@ -1,28 +1,67 @@
 #!/usr/bin/env python
+import sys
+from itertools import chain, islice
+import numpy as np
 import click
 from geosys.maps import MAP_TYPES, QMAP_PANO_BY_YX_URL, qmap_ll2yx
 
-from geosys.utils import request_data
+from geosys.utils import request_data, Session, map_ordered
+from geosys.panos import PanoIndex
+from geosys.io_ import iter_lines
+
+LL_CHUNK = 4096
+
+def parse_ll(s):
+    lat, lng = s.replace(',', ' ').split()
+    return float(lat), float(lng)
 
 @click.command()
-@click.argument("ll", type=(float, float))
+@click.argument("ll", type=(float, float), required=False)
+@click.option('-i', '--input', 'inp', type=click.File('r'),
+              help="file of 'lat lng' lines, '-' for stdin")
 @click.option('-t', '--map_type', type=click.Choice(MAP_TYPES), default='qmap')
 @click.option('-v', '--verbose', count=True)
-def main(ll, map_type, verbose):
-    if map_type == 'qmap':
+@click.option('--panos', default='', help='crawled pano directory to look up first')
+@click.option('-r', '--radius', default=20.0, help='meters to a crawled pano')
+@click.option('-j', '--workers', default=8, help='concurrent lookups')
+def main(ll, inp, map_type, verbose, panos, radius, workers):
+    if map_type != 'qmap':
+        raise
+
+    index = PanoIndex(panos) if panos else None
+    session = Session(pool_size=workers)
+
+    def fetch(ll):
         y, x = qmap_ll2yx(*ll)
-        pano = request_data(QMAP_PANO_BY_YX_URL.format(y=y, x=x))
+        pano = request_data(QMAP_PANO_BY_YX_URL.format(y=y, x=x), session=session)
         if verbose:
-            print(pano)
+            print(pano, file=sys.stderr)
+        if pano is None:
+            return
         if pano['info']['errno']:
-            print(f'get {ll} errno ({pano["info"]["errno"]})')
-            exit()
+            print(f'get {ll} errno ({pano["info"]["errno"]})', file=sys.stderr)
+            return
+        return pano['detail']['svid']
 
-        p = pano['detail']
-        print(p['svid'], *ll)
+    lls = chain([ll] if ll else [], map(parse_ll, iter_lines(inp or [])))
+    while True:
+        # a chunk is matched against the crawled panos at once, the rest
+        # goes to the map service. results stay in input order.
+        lls_ = list(islice(lls, LL_CHUNK))
+        if not lls_:
+            break
+        found = [None] * len(lls_)
+        if index:
+            d, i = index.query(*np.array(lls_).T, radius=radius)
+            for k in np.flatnonzero(i[:, 0] < len(index)):
+                found[k] = index.id(i[k, 0])
+                if verbose:
+                    print(f'{d[k, 0]:.2f}m to crawled pano', file=sys.stderr)
 
-    else:
-        raise
+        fetched = map_ordered(fetch, [j for j, f in zip(lls_, found) if f is None],
+                              workers=workers)
+        for j, f in zip(lls_, found):
+            print(f or next(fetched), *j, flush=True)
 
 
 if __name__ == "__main__":
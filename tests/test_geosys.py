@@ -1,3 +1,5 @@
+import numpy as np
+import pytest
 from geosys import __version__
 from geosys.cvt_geosys import *
 
@@ -10,5 +12,410 @@ def test_wgs84():
     wgs84_1 = wgs84_to_gcj02(*gcj02_to_wgs84(*gcj02))
     assert wgs84_1 == gcj02
 
+def test_wgs84_batch():
+    lat = np.array([39.905560, 30.0, 22.3, 48.85])
+    lng = np.array([116.391314, 100.0, 114.2, 2.35])
+    gy, gx = wgs84_to_gcj02_batch(lat, lng)
+    assert np.allclose(np.stack([gy, gx], 1),
+                       [wgs84_to_gcj02(*i) for i in zip(lat, lng)])
+    # paris is outside china and passed through
+    assert (gy[-1], gx[-1]) == (lat[-1], lng[-1])
+
+    wy, wx = gcj02_to_wgs84_batch(gy, gx)
+    assert np.allclose(wy, lat, atol=1e-9) and np.allclose(wx, lng, atol=1e-9)
+    assert np.shape(wgs84_to_gcj02_batch(39.9, 116.3)[0]) == ()
+
+def test_gcj02_inverse_newton():
+    gcj02, wgs84 = (39.906961, 116.397555), (39.905560, 116.391314)
+    assert np.allclose(gcj02_to_wgs84(*gcj02), wgs84, atol=1e-6)
+    assert np.allclose(gcj02_to_wgs84(*gcj02, method='leastsq'),
+                       gcj02_to_wgs84(*gcj02), atol=1e-12)
+
+    lat, lng = np.meshgrid(np.linspace(20, 45, 11), np.linspace(80, 130, 11))
+    wy, wx, ok = gcj02_to_wgs84_batch(lat, lng, check_china=False,
+                                      full_output=True)
+    assert ok.all() and wy.shape == lat.shape
+    gy, gx = wgs84_to_gcj02_batch(wy, wx, check_china=False)
+    assert np.abs(gy - lat).max() < 1e-12 and np.abs(gx - lng).max() < 1e-12
+
+    ok = gcj02_to_wgs84_batch(lat, lng, max_iter=1, full_output=True)[2]
+    assert not ok[in_china_batch(lat, lng)].any()
+
+def test_in_china_index():
+    from geosys.poly_index import PolygonIndex, crossing_parity
+    assert in_china(39.9, 116.3) and in_china(19.5, 109.6)
+    assert not in_china(48.85, 2.35) and not in_china(35.7, 139.7)
+
+    lat, lng = np.meshgrid(np.linspace(15, 56, 83), np.linspace(70, 140, 141))
+    m = in_china_batch(lat, lng)
+    assert m.shape == lat.shape
+    assert (m.reshape(-1) == [in_china(*i) for i in zip(lat.flat, lng.flat)]).all()
+
+    # square with a hole, checked against a brute force crossing test
+    rings = [[(0, 0), (0, 4), (4, 4), (4, 0)], [(1, 1), (1, 3), (3, 3), (3, 1)]]
+    idx = PolygonIndex(rings, grid=7)
+    y, x = np.random.default_rng(0).uniform(-1, 5, (2, 2000))
+    assert (idx.contains_many(y, x) == crossing_parity(idx.edges, y, x)).all()
+
+def test_bd09():
+    lat = np.array([39.905560, 31.2323, 48.85])
+    lng = np.array([116.391314, 121.4691, 2.35])
+    by, bx = wgs84_to_bd09_batch(lat, lng)
+    assert np.allclose(np.stack([by, bx], 1),
+                       [wgs84_to_bd09(*i) for i in zip(lat, lng)])
+    assert np.allclose(np.stack([by, bx], 1),
+                       [gcj02_to_bd09(*wgs84_to_gcj02(*i)) for i in zip(lat, lng)])
+    assert np.allclose(bd09_to_gcj02_batch(*gcj02_to_bd09_batch(lat, lng)),
+                       (lat, lng), atol=1e-5)
+
+    wy, wx, ok = bd09_to_wgs84_batch(by, bx, full_output=True)
+    assert ok.all()
+    assert np.allclose(wy, lat, atol=1e-5) and np.allclose(wx, lng, atol=1e-5)
+    assert np.allclose(bd09_to_wgs84(by[0], bx[0]), (wy[0], wx[0]))
+
+def test_geodesic_batch():
+    from geosys.geodesic import geo_dist_batch, geo_coord_batch
+    lat0, lng0 = np.array([39.9, 31.2, 0, -33.9]), np.array([116.3, 121.4, 0, 18.4])
+    lat1 = np.array([39.91, 22.3, 0.5, 40.7])
+    lng1 = np.array([116.31, 114.2, 179.7, -74])
+    d = [geo_dist(*i) for i in zip(lat0, lng0, lat1, lng1)]
+    assert np.allclose(geo_dist_batch(lat0, lng0, lat1, lng1), d, rtol=0, atol=1e-6)
+    assert np.allclose(geo_dist_batch(lat0, lng0, lat1, lng1, method='vincenty'),
+                       d, rtol=0, atol=1e-3)
+    assert abs(geo_dist_batch(*lat0[:1], *lng0[:1], *lat1[:1], *lng1[:1],
+                              method='ltp') - d[0]) < 1e-3
+
+    lat, lng = 39.9 + np.linspace(-0.01, 0.01, 5), 116.39 + np.linspace(0.01, -0.01, 5)
+    zx = np.array([geo_coord(*i, 39.9, 116.39) for i in zip(lat, lng)]).T
+    for method, tol in [('karney', 1e-6), ('vincenty', 1e-3), ('ltp', 1e-3)]:
+        assert np.allclose(geo_coord_batch(lat, lng, 39.9, 116.39, method=method), zx,
+                           rtol=0, atol=tol)
+
+def test_apply_ll2xyz_batch(tmp_path):
+    from geosys.geodesic import apply_ll2xyz_batch
+    rng = np.random.default_rng(0)
+    T = np.hstack([np.linalg.qr(rng.normal(size=(3, 3)))[0], rng.normal(size=(3, 1))])
+    trans = ((39.9, 116.39), T)
+    lat, lng = 39.9 + rng.uniform(-0.02, 0.02, (2, 100))
+    lng += 116.39 - 39.9
+    elev = rng.uniform(0, 50, 100)
+    ref = np.array([apply_ll2xyz(trans, *i) for i in zip(lat, lng, elev)])
+
+    assert np.abs(apply_ll2xyz_batch(trans, lat, lng, elev, method='karney')
+                  - ref).max() < 1e-6
+    np.save(tmp_path / 'lat.npy', lat)
+    out = apply_ll2xyz_batch(trans, np.load(tmp_path / 'lat.npy', mmap_mode='r'),
+                             lng, elev, chunk=16)
+    assert out.shape == (100, 3) and np.abs(out - ref).max() < 1e-3
+
+    # a 4x4 homogeneous matrix gives the w column too
+    H = ((39.9, 116.39), np.vstack([T, [0, 0, 0, 1]]))
+    out = apply_ll2xyz_batch(H, lat, lng, elev, method='karney')
+    assert out.shape == (100, 4) and np.abs(out[:, :3] - ref).max() < 1e-6
+    assert np.allclose(out[:, 3], 1) and np.allclose(
+        out[0], apply_ll2xyz(H, lat[0], lng[0], elev[0]))
+
+def test_proj_batch():
+    from geosys import proj, maps
+    lat, lng = np.linspace(20, 45, 7), np.linspace(80, 130, 7)
+    pairs = [
+        (proj.ll2merc, ll2merc), (proj.ll2merc_epsg3857, ll2merc_epsg3857),
+        (proj.qmap_ll2yx, maps.qmap_ll2yx),
+    ]
+    for fn, ref in pairs:
+        y, x = fn(lat, lng)
+        assert np.allclose(np.stack([y, x], 1), [ref(*i) for i in zip(lat, lng)],
+                           rtol=1e-12)
+
+    y, x = proj.qmap_ll2yx(lat, lng)
+    out = y.copy(), x.copy()
+    assert proj.qmap_yx2ll(*out, out=out)[0] is out[0]
+    assert np.allclose(out[0], lat, atol=1e-9) and np.allclose(out[1], lng, atol=1e-9)
+    assert np.allclose(proj.merc2ll(*proj.ll2merc(lat, lng)), (lat, lng))
+    assert np.allclose(proj.merc2ll_epsg3857(*proj.ll2merc_epsg3857(lat, lng)),
+                       (lat, lng))
+    with pytest.raises(AssertionError):
+        proj.ll2merc([10, 86], 0)
+
+def test_sqlite_store(tmp_path):
+    from geosys.cache import open_store, SqliteStore, DirStore
+    d = open_store(tmp_path / 'dir', '.json')
+    assert isinstance(d, DirStore)
+    d.put('a', {'x': 1})
+    d.put('b', {'x': 2})
+    d.put_record('b', {'links': ['a'], 'link_y': np.arange(2.)})
+    assert d.get_record('b') == {'links': ['a'], 'link_y': [0, 1]}
+    d.put('b', {'x': 2})
+    assert d.get_record('b') is None and d.get_record('z') is None
+
+    s = open_store(tmp_path / 'c.db', '.json')
+    assert isinstance(s, SqliteStore)
+    assert s.import_dir(tmp_path / 'dir') == 2
+    s.put('c', {'x': 3})
+    assert s.get('a') == {'x': 1} and s.get('c') == {'x': 3} and s.get('z') is None
+    assert s.contains_many(['a', 'c', 'z']) == {'a', 'c'} and 'z' not in s
+
+    s.put_record('c', {'links': ['a']})
+    assert s.get_record('c') == {'links': ['a']}
+    # a new payload drops the stale record
+    s.put('c', {'x': 4})
+    assert s.get_record('c') is None
+    s.close()
+
+def test_lru_cache():
+    from geosys.cache import LRUCache
+    c = LRUCache(max_entries=2)
+    c.put(('qmap', 'a'), 1)
+    c.put(('qmap', 'b'), 2)
+    assert c.get(('qmap', 'a')) == 1
+    c.put(('qmap', 'c'), 3)
+    assert c.get(('qmap', 'b')) is None
+    assert c.stats() == {'entries': 2, 'bytes': 0, 'hits': 1, 'misses': 1,
+                         'evictions': 1}
+
+    c = LRUCache(max_bytes=10, sizeof=len)
+    c.put('a', 'x' * 6)
+    c.put('b', 'x' * 4)
+    c.put('c', 'x' * 3)
+    assert len(c) == 2 and c.get('a') is None and c.nbytes == 7
+
+def test_negative_cache(tmp_path):
+    from geosys.cache import NegativeCache
+    f = tmp_path / 'failed.log'
+    c = NegativeCache(f, ttl=100)
+    c.add('dead')
+    c.add((39.9061353, 116.3901486))
+    c.add('old', ttl=-1)
+    assert 'dead' in c and 'old' not in c and 'alive' not in c
+    assert (39.90613531, 116.39014859) in c
+    c.close()
+    # a torn trailing line is dropped, expired entries are compacted away
+    with open(f, 'a') as fp:
+        fp.write('torn\t12')
+    c = NegativeCache(f)
+    assert len(c) == 2 and 'dead' in c
+    assert len(open(f).readlines()) == 2
+    c.close()
+
+    # with nothing expired, a torn or garbled line still gets rewritten
+    with open(f, 'a') as fp:
+        fp.write('bad\tx\ntorn\t12')
+    c = NegativeCache(f)
+    c.add('next')
+    c.close()
+    c = NegativeCache(f)
+    assert len(c) == 3 and 'next' in c and 'torn' not in c
+    c.close()
+    assert len(NegativeCache(f)) == 3
+
+def test_scheduler(monkeypatch):
+    from urllib.error import HTTPError
+    from geosys import utils
+    monkeypatch.setattr(utils, 'TIMEOUT_BASE', 0.01)
+
+    class FlakySession:
+        def __init__(self, fails):
+            self.fails = fails
+
+        def host_timeout(self, host):
+            return 1
+
+        def get(self, url, timeout=None):
+            if self.fails:
+                self.fails -= 1
+                raise HTTPError(url, 503, 'busy', None, None)
+            if url.endswith('404'):
+                raise HTTPError(url, 404, 'not found', None, None)
+            return b'data'
+
+    s = utils.Scheduler(rate=1000, burst=1)
+    assert utils.request_retry('http://a/1', session=FlakySession(2), scheduler=s) \
+        == b'data'
+    assert utils.request_retry('http://a/404', session=FlakySession(0),
+                               scheduler=s) is None
+    m = s.metrics.snapshot()
+    assert (m['requests'], m['ok'], m['failed'], m['retries']) == (4, 1, 1, 2)
+    assert m['backoff_secs'] > 0 and m['in_flight'] == 0
+    assert s.host('a').delay < 0.02
+
+    # no retry slot left, the failing request is dropped
+    s = utils.Scheduler(retry_queue=1)
+    s.retry_slots.acquire()
+    assert s.get(FlakySession(1), 'http://a/1') is None
+    assert s.metrics.snapshot()['dropped'] == 1
+    with pytest.raises(utils.RequestFailed):
+        s.get(FlakySession(1), 'http://a/1', raise_failed=True)
+
+    # an error status is an answer, not a failed request
+    s = utils.Scheduler()
+    assert s.get(FlakySession(0), 'http://a/404', raise_failed=True) is None
+    with pytest.raises(utils.RequestFailed):
+        s.get(FlakySession(2), 'http://a/1', retry=2, raise_failed=True)
+
+    # the timeout of the session for the host, doubled on each retry
+    class TimedSession(utils.Session):
+        def get(self, url, timeout=None):
+            timeouts.append(timeout)
+            if len(timeouts) < 3:
+                raise OSError('timed out')
+            return b'data'
+
+    timeouts = []
+    session = TimedSession(timeout=2, host_timeouts={'b': 30})
+    assert s.get(session, 'http://b/1') == b'data'
+    assert timeouts == [30, 60, 120]
+    timeouts = []
+    assert s.get(session, 'http://a/1') == b'data'
+    assert timeouts == [2, 4, 8]
+
+def test_fix_xml_error(tmp_path):
+    from geosys.utils import fix_xml_error, fix_xml_error_iter
+    from geosys.io_ import load_xml
+    s = '<a n="A&B &amp; &lt;&gt; &apos;&quot; &#65;&#x4a; &x; &a.b"/>'
+    fixed = ('<a n="A&amp;B &amp; &lt;&gt; &apos;&quot; &#65;&#x4a; '
+             '&amp;x; &amp;a.b"/>')
+    assert fix_xml_error(s) == fixed
+    assert fix_xml_error(s.encode()) == fixed.encode()
+    for n in range(1, 8):
+        b = s.encode()
+        chunks = [b[i:i + n] for i in range(0, len(b), n)]
+        assert b''.join(fix_xml_error_iter(chunks)) == fixed.encode()
+
+    f = tmp_path / 'a.xml'
+    f.write_text(s)
+    assert load_xml(f, fix_err=True).get('n') == "A&B & <> '\" AJ &x; &a.b"
+
+def test_request_data():
+    from urllib.error import HTTPError
+    from geosys.utils import request_data, Scheduler, StageTimer
+
+    class Session:
+        def __init__(self, body):
+            self.body = body
+
+        def host_timeout(self, host):
+            return 1
+
+        def get(self, url, timeout=None):
+            if self.body is None:
+                raise HTTPError(url, 404, 'not found', None, None)
+            return self.body
+
+    def get(url, body, **kws):
+        return request_data(url, session=Session(body), scheduler=Scheduler(),
+                            **kws)
+
+    timing = StageTimer()
+    assert get('http://a/?cb=f', b'f({"a": [1, "\xc3\xa9"]});\n',
+               timing=timing) == {'a': [1, 'é']}
+    assert set(timing.stats()) == {'fetch', 'strip', 'parse'}
+    e = get('http://a/?cb=0', b'\n<?xml version="1.0"?><a n="x&y"/>')
+    assert e.tag == 'a' and e.get('n') == 'x&y'
+    assert get('http://a/', None) is None
+
+def test_qmap_pano_record(tmp_path):
+    from pathlib import Path
+    from lxml import etree
+    from geosys import proj
+    from geosys.maps import qmap_pano_record, qmap_yx2ll
+    b = (Path(__file__).parent.parent / 'samples/data/pano_cache'
+         / '10011059150713114528300.xml').read_bytes()
+    r = qmap_pano_record(b)
+    assert r['id'] == '10011059150713114528300' and len(r['links']) == 85
+    e = qmap_pano_record(etree.fromstring(b))
+    assert e['links'] == r['links'] and (e['link_y'] == r['link_y']).all()
+    lat, lng = proj.qmap_yx2ll(r['link_y'], r['link_x'])
+    assert qmap_yx2ll(r['link_y'][0], r['link_x'][0]) == pytest.approx(
+        (lat[0], lng[0]), abs=1e-9)
+    assert qmap_pano_record(b'<qqsv><error/></qqsv>') is None
+
+    # a record read back from a store parses like the pano itself
+    from geosys.cache import DirStore
+    from geosys.maps import qmap_parse_pano_info
+    s = DirStore(tmp_path, '.xml')
+    s.put_record(r['id'], r)
+    assert qmap_parse_pano_info(s.get_record(r['id'])) == qmap_parse_pano_info(b)
+
+def test_pano_records(tmp_path):
+    import yaml
+    from pathlib import Path
+    from geosys.panos import (
+        PanoRecord, dump_panos, load_panos, load_pano_columns, iter_pano_ids)
+    ref = yaml.safe_load(open(Path(__file__).parent.parent
+                              / 'samples/data/tiananmen/region_panos.yaml'))
+    recs = [PanoRecord.from_info(i) for i in ref.values()]
+
+    d = tmp_path / 'a.panos'
+    dump_panos(recs, d)
+    c = load_pano_columns(d)
+    assert isinstance(c['lat'], np.memmap) and c['ori'].shape == (len(ref), 3)
+    assert list(iter_pano_ids(d)) == list(ref)
+    assert list(load_panos(d).values()) == recs
+
+    f = tmp_path / 'a.yaml'
+    dump_panos(recs, f)
+    assert yaml.safe_load(open(f)) == ref
+    assert list(iter_pano_ids(f)) == list(ref)
+
+def test_pano_index(tmp_path):
+    from geosys.panos import PanoRecord, PanoIndex, save_panos
+    lats = 39.9 + np.arange(10) * 1e-3
+    save_panos([PanoRecord(str(i), lat, 116.39) for i, lat in enumerate(lats)],
+               tmp_path / 'a.panos')
+    index = PanoIndex(tmp_path / 'a.panos')
+    assert (tmp_path / 'a.panos' / 'xyz.npy').exists()
+
+    d, i = index.query([39.9041, 0], [116.39, 116.39], k=2, radius=1000)
+    assert i[0].tolist() == [4, 5] and index.id(i[0, 0]) == '4'
+    dist = geo_dist(39.9041, 116.39, lats[4], 116.39)
+    assert d[0, 0] == pytest.approx(dist, rel=5e-3)
+    assert (i[1] == len(index)).all() and np.isinf(d[1]).all()
+    assert sorted(PanoIndex(tmp_path / 'a.panos').query_radius(
+        39.9041, 116.39, 150)[0]) == [3, 4, 5]
+
+def test_map_ordered():
+    import time
+    from itertools import count, islice
+    from geosys.utils import map_ordered
+
+    def fn(i):
+        time.sleep(0.001 * (i % 3))
+        return i * i
+
+    assert list(map_ordered(fn, range(50), workers=4)) == [i * i for i in range(50)]
+    # endless input, only a window ahead is consumed
+    src = count()
+    assert list(islice(map_ordered(fn, src, workers=2, window=4), 3)) == [0, 1, 4]
+    assert next(src) <= 8
+
+def test_tile_cache(tmp_path):
+    from geosys.cache import TileCache
+    c = TileCache(tmp_path)
+    k = 'qmap', '10011059150713114528300', 3, 0, 1
+    assert c.get(k) is None and k not in c
+    c.put(k, b'jpeg')
+    c.put(k, b'jpeg2')
+    assert c.get(k) == b'jpeg2' and c.get(k[:-1] + (2,)) is None
+    assert [i.name for i in tmp_path.rglob('*') if i.is_file()] == [c.path(k).name]
+    c.discard(k)
+    assert k not in c
+
+def test_pyramid(tmp_path):
+    from PIL import Image
+    from geosys.pyramid import write_pyramid, PanoPyramid
+    a = np.zeros((600, 1200, 3), dtype=np.uint8)
+    a[:, 600:] = 200
+    f = tmp_path / 'a.pyr'
+    write_pyramid(Image.fromarray(a), f, {1: (1200, 600), 0: (600, 300)}, tile=256)
+    with PanoPyramid(f) as p:
+        assert p.levels[1] == {'w': 1200, 'h': 600, 'rows': 3, 'cols': 5}
+        full = p.read(1)
+        assert full.shape == a.shape
+        assert np.abs(full.astype(int) - a).mean() < 2
+        assert (p.read(1, 250, 500, 530, 1190) == full[250:530, 500:1190]).all()
+        low = p.read(0)
+        assert low.shape == (300, 600, 3) and abs(int(low[10, 450, 0]) - 200) < 3
+
+
 if __name__ == "__main__":
     test_wgs84()